@@ -60,6 +60,19 @@ chaquopy {
             install("pandas==1.3.2")
         }
     }
+    sourceSets {
+        getByName("main") {
+            // Herramientas offline (ajuste de parametros y benchmarks), pruebas y paquetes de
+            // desarrollo: se corren en la PC y no se empaquetan en el APK
+            exclude(
+                "calibracion_tuner.py",
+                "calibracion_benchmark.py",
+                "progress_charts_benchmark.py",
+                "test_*.py",
+                "*.whl"
+            )
+        }
+    }
 }
 
 dependencies {
@@ -2,7 +2,6 @@ package com.example.keyfairy.feature_progress.presentation.viewModel
 
 import android.graphics.Bitmap
 import android.graphics.BitmapFactory
-import android.util.Base64
 import androidx.lifecycle.LiveData
 import androidx.lifecycle.MutableLiveData
 import androidx.lifecycle.ViewModel
@@ -72,7 +71,7 @@ class ProgressViewModel(
                     pyModule.callAttr(functionName, pyData)
                 }
 
-                val imageBytes = Base64.decode(pyResult.toString(), Base64.DEFAULT)
+                val imageBytes = pyResult.toJava(ByteArray::class.java)
                 val bitmap = BitmapFactory.decodeByteArray(imageBytes, 0, imageBytes.size)
 
                 onResult(GraphState.Success(bitmap))
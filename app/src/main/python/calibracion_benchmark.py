@@ -0,0 +1,294 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import calibracion
+
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+PIANO_AREA_PERCENTAGE = 0.6
+
+WHITE_KEYS = 52
+# Posicion de las teclas negras dentro de una octava (indice de la tecla blanca a su izquierda)
+BLACK_KEY_PATTERN = (0, 1, 3, 4, 5)
+
+
+# ==========================================================
+# 🔸 Generador de pianos sinteticos
+# ==========================================================
+def _keyboard_texture(width=1040, height=150):
+    # Teclado frontal de 52 teclas blancas con sus teclas negras
+    keyboard = np.full((height, width), 235, np.uint8)
+    key_width = width / WHITE_KEYS
+    for i in range(1, WHITE_KEYS):
+        x = int(round(i * key_width))
+        cv2.line(keyboard, (x, 0), (x, height - 1), 120, 1)
+
+    black_width = int(key_width * 0.6)
+    black_height = int(height * 0.62)
+    # El teclado de 88 teclas empieza en La: la primera octava completa arranca en la tecla 2 (Do)
+    cv2.rectangle(keyboard, (int(key_width - black_width / 2), 0), (int(key_width + black_width / 2), black_height), 30, -1)
+    for octave_start in range(2, WHITE_KEYS - 1, 7):
+        for offset in BLACK_KEY_PATTERN:
+            white_index = octave_start + offset
+            if white_index + 1 >= WHITE_KEYS:
+                break
+            x = (white_index + 1) * key_width
+            cv2.rectangle(keyboard, (int(x - black_width / 2), 0), (int(x + black_width / 2), black_height), 30, -1)
+    return keyboard
+
+
+def _target_quad(center, piano_width, aspect, rotation, perspective):
+    half_width = piano_width / 2.0
+    half_height = piano_width * aspect / 2.0
+    top_half_width = half_width * (1.0 - perspective)
+    # Orden: superior izquierda, superior derecha, inferior derecha, inferior izquierda
+    quad = np.array([
+        [-top_half_width, -half_height],
+        [top_half_width, -half_height],
+        [half_width, half_height],
+        [-half_width, half_height],
+    ], np.float64)
+    theta = np.radians(rotation)
+    rotation_matrix = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    return quad @ rotation_matrix.T + np.asarray(center, np.float64)
+
+
+def expected_command(corners, frame_width=FRAME_WIDTH, frame_height=FRAME_HEIGHT,
+                     piano_area_percentage=PIANO_AREA_PERCENTAGE):
+    # Esquinas en coordenadas de RESIZE_WIDTH y la altura que usara el pipeline
+    keep_height = int(int(frame_width * (frame_height / frame_width)) * piano_area_percentage)
+    new_height = int(keep_height * calibracion.RESIZE_WIDTH / frame_width)
+    return calibracion.instruction_command(np.asarray(corners, np.float32).reshape(4, 1, 2), new_height)
+
+
+def render_synthetic_piano(center=(640, 180), piano_width=880, aspect=0.25, rotation=0.0, perspective=0.0,
+                           brightness=1.0, blur=0.0, noise=0.0, distractor=None, frame_width=FRAME_WIDTH,
+                           frame_height=FRAME_HEIGHT, piano_area_percentage=PIANO_AREA_PERCENTAGE, seed=0):
+    rng = np.random.RandomState(seed)
+    keyboard = _keyboard_texture()
+    keyboard_height, keyboard_width = keyboard.shape
+    source = np.float32([[0, 0], [keyboard_width, 0], [keyboard_width, keyboard_height], [0, keyboard_height]])
+    quad = _target_quad(center, piano_width, aspect, rotation, perspective)
+    homography = cv2.getPerspectiveTransform(source, quad.astype(np.float32))
+
+    background = rng.randint(20, 70, (frame_height // 16 + 1, frame_width // 16 + 1)).astype(np.uint8)
+    frame = cv2.resize(background, (frame_width, frame_height), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+    if distractor is not None:
+        # Hoja de partitura o reflejo: rectangulo claro (x, y, ancho, alto) que compite con el piano
+        x, y, width, height = distractor
+        frame[y:y + height, x:x + width] = 245
+    warped = cv2.warpPerspective(keyboard, homography, (frame_width, frame_height)).astype(np.float32)
+    mask = cv2.warpPerspective(np.full_like(keyboard, 255), homography, (frame_width, frame_height)) > 127
+    frame[mask] = warped[mask]
+
+    # Iluminacion: ganancia global con un degradado horizontal suave
+    gradient = np.linspace(0.9, 1.1, frame_width, dtype=np.float32)
+    frame *= brightness * gradient[np.newaxis, :]
+    if blur > 0:
+        frame = cv2.GaussianBlur(frame, (0, 0), blur)
+    if noise > 0:
+        frame += rng.normal(0.0, noise, frame.shape).astype(np.float32)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+
+    _, jpeg = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    scale = calibracion.RESIZE_WIDTH / frame_width
+    corners = (quad + 0.5) * scale - 0.5
+    keep_height = int(int(frame_width * (frame_height / frame_width)) * piano_area_percentage)
+    visible = bool(np.all((quad >= 0) & (quad < [frame_width, keep_height])))
+    return {
+        'frame': frame,
+        'jpeg': jpeg.tobytes(),
+        'corners': corners,
+        'visible': visible,
+        'command': expected_command(corners, frame_width, frame_height, piano_area_percentage),
+        'height_to_width_ratio': frame_height / frame_width,
+        'piano_area_percentage': piano_area_percentage,
+    }
+
+
+def synthetic_corpus(count=60, seed=0):
+    # Mezcla de frames centrados y desplazados / girados para cubrir todos los comandos
+    rng = np.random.RandomState(seed)
+    scenarios = [
+        dict(center=(640, 180)),
+        dict(center=(420, 180)),
+        dict(center=(860, 180)),
+        dict(center=(640, 190), rotation=9.0),
+        dict(center=(640, 190), rotation=-9.0),
+        dict(center=(640, 80)),
+        dict(center=(640, 330)),
+        dict(center=(640, 180), piano_width=1300),
+    ]
+    corpus = []
+    for i in range(count):
+        params = dict(scenarios[i % len(scenarios)])
+        params.setdefault('piano_width', float(rng.uniform(780, 960)))
+        params['center'] = tuple(np.asarray(params['center']) + rng.uniform(-12, 12, 2))
+        params.setdefault('rotation', float(rng.uniform(-2.0, 2.0)))
+        params['aspect'] = float(rng.uniform(0.2, 0.28))
+        params['perspective'] = float(rng.uniform(0.0, 0.05))
+        params['brightness'] = float(rng.uniform(0.95, 1.1))
+        params['blur'] = float(rng.uniform(0.0, 1.2))
+        params['noise'] = float(rng.uniform(0.0, 4.0))
+        params['seed'] = seed + i
+        sample = render_synthetic_piano(**params)
+        sample['params'] = params
+        corpus.append(sample)
+    return corpus
+
+
+# ==========================================================
+# 🔹 Benchmark de velocidad y precision
+# ==========================================================
+def _corner_error(detected, expected):
+    detected_quad = calibracion._order_quad(np.asarray(detected, np.float32))
+    expected_quad = calibracion._order_quad(np.asarray(expected, np.float32))
+    return float(np.linalg.norm(detected_quad - expected_quad, axis=1).mean())
+
+
+def run_benchmark(corpus, warmup=3, analyze=None, **options):
+    # `analyze` recibe un sample del corpus y devuelve el dict command/corners; por
+    # defecto se usa is_calibrated con las opciones indicadas (mode, decode_scale, ...)
+    if analyze is None:
+        def analyze(sample):
+            return json.loads(calibracion.is_calibrated(
+                sample['jpeg'], sample['piano_area_percentage'], sample['height_to_width_ratio'], None, **options
+            ))
+
+    for sample in corpus[:warmup]:
+        analyze(sample)
+
+    latencies = []
+    results = []
+    start = time.perf_counter()
+    for sample in corpus:
+        frame_start = time.perf_counter()
+        results.append(analyze(sample))
+        latencies.append((time.perf_counter() - frame_start) * 1000.0)
+    elapsed = time.perf_counter() - start
+
+    # Segunda pasada solo para memoria: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    try:
+        for sample in corpus[:max(1, min(len(corpus), 10))]:
+            analyze(sample)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    hits = 0
+    corner_errors = []
+    for sample, result in zip(corpus, results):
+        hits += result['command'] == sample['command']
+        if sample['visible'] and result['corners']:
+            corner_errors.append(_corner_error(result['corners'], sample['corners']))
+
+    latencies = np.array(latencies)
+    return {
+        'frames': len(corpus),
+        'fps': len(corpus) / elapsed if elapsed > 0 else float('inf'),
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p95_ms': float(np.percentile(latencies, 95)),
+        'latency_max_ms': float(latencies.max()),
+        'peak_memory_bytes': int(peak_bytes),
+        'corner_error_mean_px': float(np.mean(corner_errors)) if corner_errors else None,
+        'corner_error_p95_px': float(np.percentile(corner_errors, 95)) if corner_errors else None,
+        'command_accuracy': hits / len(corpus),
+    }
+
+
+def compare_corner_methods(corpus, warmup=3, **options):
+    # Mismo corpus con ambos extractores de esquinas: Shi-Tomasi sobre el cascaron
+    # rasterizado contra el ajuste directo del poligono
+    report = {
+        method: run_benchmark(corpus, warmup=warmup, corner_method=method, **options)
+        for method in (calibracion.CORNERS_SHI_TOMASI, calibracion.CORNERS_POLYGON)
+    }
+    shi_tomasi = report[calibracion.CORNERS_SHI_TOMASI]
+    polygon = report[calibracion.CORNERS_POLYGON]
+    report['latency_p50_delta_ms'] = shi_tomasi['latency_p50_ms'] - polygon['latency_p50_ms']
+    report['latency_p95_delta_ms'] = shi_tomasi['latency_p95_ms'] - polygon['latency_p95_ms']
+    return report
+
+
+def check_thresholds(report, min_fps=None, max_p95_ms=None, max_corner_error=None, min_accuracy=None):
+    failures = []
+    if min_fps is not None and report['fps'] < min_fps:
+        failures.append(f"fps {report['fps']:.1f} < {min_fps}")
+    if max_p95_ms is not None and report['latency_p95_ms'] > max_p95_ms:
+        failures.append(f"latencia p95 {report['latency_p95_ms']:.2f} ms > {max_p95_ms}")
+    if max_corner_error is not None:
+        error = report['corner_error_mean_px']
+        if error is None or error > max_corner_error:
+            failures.append(f"error de esquinas {error} px > {max_corner_error}")
+    if min_accuracy is not None and report['command_accuracy'] < min_accuracy:
+        failures.append(f"precision de comandos {report['command_accuracy']:.3f} < {min_accuracy}")
+    return failures
+
+
+def check_regression(report, baseline, tolerance=0.2):
+    # Compara contra un reporte previo: falla si la velocidad o la precision empeoran
+    # mas que `tolerance` (fraccion relativa)
+    failures = []
+    if report['fps'] < baseline['fps'] * (1.0 - tolerance):
+        failures.append(f"fps {report['fps']:.1f} vs base {baseline['fps']:.1f}")
+    if report['latency_p95_ms'] > baseline['latency_p95_ms'] * (1.0 + tolerance):
+        failures.append(f"latencia p95 {report['latency_p95_ms']:.2f} ms vs base {baseline['latency_p95_ms']:.2f} ms")
+    if report['command_accuracy'] < baseline['command_accuracy'] - tolerance * (1.0 - baseline['command_accuracy']) - 1e-9:
+        failures.append(f"precision {report['command_accuracy']:.3f} vs base {baseline['command_accuracy']:.3f}")
+    base_error = baseline.get('corner_error_mean_px')
+    error = report['corner_error_mean_px']
+    if base_error is not None and (error is None or error > base_error * (1.0 + tolerance) + 0.5):
+        failures.append(f"error de esquinas {error} px vs base {base_error:.2f} px")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sintetico de calibracion.is_calibrated")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default=calibracion.MODE_FULL)
+    parser.add_argument("--decode-scale", type=int, default=1)
+    parser.add_argument("--selector", default=calibracion.SELECTOR_SCORE)
+    parser.add_argument("--corner-method", default=calibracion.CORNERS_SHI_TOMASI)
+    parser.add_argument("--compare-corner-methods", action="store_true",
+                        help="Reporta ambos extractores de esquinas y la diferencia de latencia")
+    parser.add_argument("--min-fps", type=float)
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-corner-error", type=float)
+    parser.add_argument("--min-accuracy", type=float)
+    parser.add_argument("--baseline", help="Reporte JSON previo contra el que se compara")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save", help="Guarda el reporte como JSON (para usarlo como --baseline)")
+    args = parser.parse_args(argv)
+
+    corpus = synthetic_corpus(args.frames, args.seed)
+    if args.compare_corner_methods:
+        print(json.dumps(compare_corner_methods(corpus, mode=args.mode, decode_scale=args.decode_scale,
+                                                selector=args.selector), indent=2))
+        return 0
+    report = run_benchmark(corpus, mode=args.mode, decode_scale=args.decode_scale, selector=args.selector,
+                           corner_method=args.corner_method)
+    print(json.dumps(report, indent=2))
+
+    failures = check_thresholds(report, args.min_fps, args.max_p95_ms, args.max_corner_error, args.min_accuracy)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += check_regression(report, json.load(f), args.tolerance)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"REGRESION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
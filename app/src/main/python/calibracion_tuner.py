@@ -0,0 +1,227 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+import calibracion
+import calibracion_benchmark
+
+# Herramienta offline (excluida del APK en el bloque chaquopy de app/build.gradle.kts):
+# barre los parametros del pipeline de deteccion sobre frames etiquetados usando todos los
+# nucleos y escribe un perfil JSON que calibracion.load_profile carga al iniciar.
+#
+# Directorio de frames etiquetados: imagenes + labels.json con una entrada por frame
+#   {"file": "0001.jpg", "command": "calibrado", "corners": [[x, y] x 4],
+#    "piano_area_percentage": 0.6, "height_to_width_ratio": 0.5625}
+# Las esquinas van en coordenadas de RESIZE_WIDTH (las mismas que devuelve is_calibrated)
+# y pueden ser null si el piano no es visible completo.
+
+LABELS_FILE = "labels.json"
+PARAM_GRID = {
+    "threshold": (128, 152, 176, 200),
+    "canny_low": (80, 140),
+    "canny_high": (250, 350),
+    "dilation_kernel": (3, 5),
+    "quality_level": (0.01, 0.05),
+    "min_distance": (20, 30),
+}
+# Rangos de brillo medio (calibracion.frame_brightness) para los perfiles por iluminacion
+LIGHTING_BUCKETS = (
+    ("dark", 90.0),
+    ("normal", 160.0),
+    ("bright", 255.0),
+)
+# Frames minimos para generar el perfil de un rango de iluminacion
+MIN_BUCKET_FRAMES = 8
+
+
+# ==========================================================
+# 🔹 Frames etiquetados
+# ==========================================================
+def load_labelled_frames(directory):
+    with open(os.path.join(directory, LABELS_FILE)) as f:
+        labels = json.load(f)
+    samples = []
+    for label in labels:
+        frame = cv2.imread(os.path.join(directory, label['file']), cv2.IMREAD_GRAYSCALE)
+        if frame is None:
+            raise ValueError(f"No se pudo leer {label['file']}")
+        corners = label.get('corners')
+        samples.append({
+            'name': label['file'],
+            'cropped': calibracion._crop_piano_area(frame, label['piano_area_percentage'],
+                                                    label['height_to_width_ratio']),
+            'command': label['command'],
+            'corners': np.asarray(corners, np.float32) if corners is not None else None,
+        })
+    return samples
+
+
+def export_corpus(corpus, directory):
+    # Escribe un corpus de calibracion_benchmark con el formato de load_labelled_frames
+    os.makedirs(directory, exist_ok=True)
+    labels = []
+    for i, sample in enumerate(corpus):
+        name = f"{i:04d}.jpg"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(sample['jpeg'])
+        labels.append({
+            'file': name,
+            'command': sample['command'],
+            'corners': np.asarray(sample['corners']).reshape(4, 2).tolist() if sample['visible'] else None,
+            'piano_area_percentage': sample['piano_area_percentage'],
+            'height_to_width_ratio': sample['height_to_width_ratio'],
+        })
+    with open(os.path.join(directory, LABELS_FILE), "w") as f:
+        json.dump(labels, f, indent=2)
+    return directory
+
+
+# ==========================================================
+# 🔹 Evaluacion de un juego de parametros
+# ==========================================================
+def parameter_grid(grid=None):
+    grid = grid or PARAM_GRID
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        if params.get("canny_low", 0) < params.get("canny_high", 1):
+            yield params
+
+
+def evaluate_params(samples, params, mode=calibracion.MODE_FULL):
+    # Los parametros que la grilla no barre conservan su valor por defecto
+    params = calibracion._normalize_params(params)
+    hits = 0
+    corner_errors = []
+    durations = []
+    for sample in samples:
+        start = time.perf_counter()
+        result = calibracion._analyze_cropped_frame(sample['cropped'], mode, params=params)
+        durations.append((time.perf_counter() - start) * 1000.0)
+        hits += result['command'] == sample['command']
+        if sample['corners'] is not None and result['corners']:
+            detected = calibracion._order_quad(np.asarray(result['corners'], np.float32))
+            expected = calibracion._order_quad(sample['corners'])
+            corner_errors.append(float(np.linalg.norm(detected - expected, axis=1).mean()))
+    return {
+        'params': dict(params),
+        'frames': len(samples),
+        'accuracy': hits / len(samples) if samples else 0.0,
+        'corner_error_px': float(np.mean(corner_errors)) if corner_errors else None,
+        'ms_per_frame': float(np.median(durations)) if durations else 0.0,
+    }
+
+
+def rank_results(results):
+    # Primero la precision, luego el costo por frame; el error de esquinas desempata
+    return sorted(results, key=lambda r: (
+        -round(r['accuracy'], 3),
+        round(r['ms_per_frame'], 1),
+        r['corner_error_px'] if r['corner_error_px'] is not None else float('inf'),
+    ))
+
+
+# Cada proceso recibe los frames una sola vez (initializer) y despues solo parametros
+_worker_samples = None
+
+
+def _init_worker(samples):
+    global _worker_samples
+    _worker_samples = samples
+    cv2.setNumThreads(1)
+
+
+def _evaluate_in_worker(params, mode):
+    return evaluate_params(_worker_samples, params, mode)
+
+
+def sweep(samples, grid=None, workers=None, mode=calibracion.MODE_FULL):
+    candidates = list(parameter_grid(grid))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(candidates) == 1:
+        results = [evaluate_params(samples, params, mode) for params in candidates]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(samples,)) as executor:
+            results = list(executor.map(_evaluate_in_worker, candidates, itertools.repeat(mode),
+                                        chunksize=max(1, len(candidates) // (workers * 4))))
+    return rank_results(results)
+
+
+# ==========================================================
+# 🔹 Perfil por iluminacion
+# ==========================================================
+def split_by_lighting(samples, buckets=LIGHTING_BUCKETS):
+    groups = {name: [] for name, _ in buckets}
+    for sample in samples:
+        brightness = calibracion.frame_brightness(sample['cropped'])
+        for name, max_brightness in buckets:
+            if brightness <= max_brightness:
+                groups[name].append(sample)
+                break
+    return groups
+
+
+def tune(samples, grid=None, workers=None, mode=calibracion.MODE_FULL, buckets=LIGHTING_BUCKETS,
+         min_bucket_frames=MIN_BUCKET_FRAMES, top=5):
+    overall = sweep(samples, grid, workers, mode)
+    profile = {
+        'default': overall[0]['params'],
+        'lighting': [],
+        'report': {'all': overall[:top]},
+    }
+    groups = split_by_lighting(samples, buckets)
+    for name, max_brightness in buckets:
+        group = groups[name]
+        if len(group) < min_bucket_frames:
+            continue
+        ranked = sweep(group, grid, workers, mode)
+        profile['lighting'].append({'name': name, 'max_brightness': max_brightness, 'params': ranked[0]['params']})
+        profile['report'][name] = ranked[:top]
+    return profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajuste offline de los parametros de deteccion de calibracion")
+    parser.add_argument("frames", nargs="?", help="Directorio con imagenes y labels.json")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Usa N frames sinteticos de calibracion_benchmark en lugar de un directorio")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default=calibracion.MODE_FULL)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--output", default="calibration_profile.json")
+    args = parser.parse_args(argv)
+
+    if args.frames:
+        samples = load_labelled_frames(args.frames)
+    elif args.synthetic:
+        with tempfile.TemporaryDirectory() as directory:
+            samples = load_labelled_frames(
+                export_corpus(calibracion_benchmark.synthetic_corpus(args.synthetic, args.seed), directory)
+            )
+    else:
+        parser.error("Indique un directorio de frames o --synthetic N")
+
+    start = time.perf_counter()
+    profile = tune(samples, workers=args.workers, mode=args.mode, top=args.top)
+    elapsed = time.perf_counter() - start
+    with open(args.output, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    for rank, result in enumerate(profile['report']['all'], 1):
+        print(f"{rank}. accuracy={result['accuracy']:.3f} ms={result['ms_per_frame']:.2f} "
+              f"error={result['corner_error_px']} {result['params']}")
+    print(f"Perfil escrito en {args.output} ({len(profile['lighting'])} perfiles de iluminacion, {elapsed:.1f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
-from music21 import scale
+from lazy_imports import lazy_import, run_steps
+
+# music21 tarda en importar: se carga en el primer uso o en warmup
+scale = lazy_import("music21.scale")
 
 def obtener_escalas():
     traducciones_escalas = {
@@ -34,3 +37,11 @@ def obtener_escalas():
             resultado.append(f"{nombre_escala}: {', '.join(notas_texto)}")
 
     return resultado
+
+
+def warmup():
+    # Importa music21 y construye una escala para inicializar sus tablas internas
+    return run_steps([
+        ("import_music21", lambda: scale.MajorScale),
+        ("build_scale", lambda: scale.MajorScale("C").getPitches("C4", "C5")),
+    ])
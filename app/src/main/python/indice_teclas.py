@@ -0,0 +1,139 @@
+import json
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from music_utils import solfege_note_dict
+from rectificacion import RECTIFIED_HEIGHT, RECTIFIED_WIDTH, keyboard_homography, parse_corners
+
+cv2 = lazy_import("cv2")
+
+# Teclado de 88 teclas: de La0 (MIDI 21) a Do8, 52 teclas blancas
+FIRST_MIDI = 21
+WHITE_KEYS = 52
+# Proporciones de las teclas negras respecto a una tecla blanca (ancho) y al teclado (largo)
+BLACK_KEY_WIDTH_RATIO = 0.6
+BLACK_KEY_LENGTH_RATIO = 0.62
+# Clases de altura (MIDI % 12) de las teclas negras
+BLACK_PITCH_CLASSES = (1, 3, 6, 8, 10)
+NOTE_NAMES = tuple(solfege_note_dict)
+NO_KEY = -1
+
+
+def note_name(midi):
+    return f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}"
+
+
+class KeyIndex:
+    # Intervalos en x de cada tecla blanca y negra sobre la imagen cenital del teclado
+    # (rectificacion), con su nombre y numero MIDI. Se construye una vez por calibracion y
+    # responde "que tecla hay bajo este punto" con searchsorted sobre muchos puntos a la vez.
+    # Con la homografia de la calibracion tambien acepta puntos en coordenadas del frame.
+
+    def __init__(self, first_midi=FIRST_MIDI, white_keys=WHITE_KEYS, width=RECTIFIED_WIDTH,
+                 height=RECTIFIED_HEIGHT, homography=None):
+        if first_midi % 12 in BLACK_PITCH_CLASSES:
+            raise ValueError(f"El teclado visible debe empezar en una tecla blanca, no en {note_name(first_midi)}")
+        self.first_midi = first_midi
+        self.white_keys = white_keys
+        self.width = width
+        self.height = height
+        self.homography = None if homography is None else np.asarray(homography, np.float64)
+
+        midis = np.arange(first_midi, first_midi + 2 * white_keys)
+        is_black = np.isin(midis % 12, BLACK_PITCH_CLASSES)
+        self.white_midis = midis[~is_black][:white_keys]
+        key_width = width / white_keys
+        self.white_edges = np.arange(white_keys + 1) * key_width
+
+        # Cada tecla negra queda centrada sobre el borde entre dos blancas consecutivas
+        last_midi = self.white_midis[-1]
+        black = midis[is_black & (midis > first_midi) & (midis < last_midi)]
+        boundary = np.searchsorted(self.white_midis, black)
+        half_width = key_width * BLACK_KEY_WIDTH_RATIO / 2.0
+        self.black_midis = black
+        self.black_starts = self.white_edges[boundary] - half_width
+        self.black_ends = self.white_edges[boundary] + half_width
+        self.black_length = height * BLACK_KEY_LENGTH_RATIO
+
+    @classmethod
+    def from_calibration(cls, corners, frame_width=None, **options):
+        # `corners` como en rectificacion.parse_corners (respuesta de is_calibrated incluida)
+        quad = parse_corners(corners, frame_width)
+        if quad is None:
+            raise ValueError("La calibracion no tiene cuatro esquinas")
+        width = options.get('width', RECTIFIED_WIDTH)
+        height = options.get('height', RECTIFIED_HEIGHT)
+        return cls(homography=keyboard_homography(quad, width, height), **options)
+
+    def lookup(self, points):
+        # points: (N, 2) en coordenadas de la imagen cenital; devuelve el MIDI de cada punto
+        # o NO_KEY si cae fuera del teclado. Las negras (mitad superior) tienen prioridad.
+        points = np.asarray(points, np.float64).reshape(-1, 2)
+        x, y = points[:, 0], points[:, 1]
+        keys = np.full(len(points), NO_KEY, np.int64)
+
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        white = np.clip(np.searchsorted(self.white_edges, x, side='right') - 1, 0, self.white_keys - 1)
+        keys[inside] = self.white_midis[white[inside]]
+
+        if len(self.black_midis):
+            black = np.searchsorted(self.black_starts, x, side='right') - 1
+            candidate = np.clip(black, 0, len(self.black_midis) - 1)
+            on_black = inside & (black >= 0) & (x < self.black_ends[candidate]) & (y < self.black_length)
+            keys[on_black] = self.black_midis[candidate[on_black]]
+        return keys
+
+    def lookup_frame(self, points):
+        # Igual que lookup pero con puntos del frame de la camara
+        if self.homography is None:
+            raise ValueError("El indice no tiene homografia: construyalo con from_calibration")
+        points = np.asarray(points, np.float32).reshape(-1, 1, 2)
+        return self.lookup(cv2.perspectiveTransform(points, self.homography).reshape(-1, 2))
+
+    def key_at(self, x, y, frame=False):
+        midi = int((self.lookup_frame if frame else self.lookup)([(x, y)])[0])
+        return self.describe(midi)
+
+    def key_for_blob(self, points, frame=False):
+        # Tecla con mas puntos del blob (contorno o pixeles de una yema); None si ninguno cae en el teclado
+        keys = (self.lookup_frame if frame else self.lookup)(points)
+        keys = keys[keys != NO_KEY]
+        if not keys.size:
+            return None
+        values, counts = np.unique(keys, return_counts=True)
+        return self.describe(int(values[counts.argmax()]))
+
+    def describe(self, midi):
+        if midi == NO_KEY:
+            return None
+        return {'midi': midi, 'name': note_name(midi), 'black': bool(midi % 12 in BLACK_PITCH_CLASSES)}
+
+    def keys(self):
+        # Lista plana de teclas con su intervalo en x (util para dibujar en Kotlin)
+        keys = [
+            dict(self.describe(int(midi)), x0=float(self.white_edges[i]), x1=float(self.white_edges[i + 1]))
+            for i, midi in enumerate(self.white_midis)
+        ]
+        keys += [
+            dict(self.describe(int(midi)), x0=float(start), x1=float(end))
+            for midi, start, end in zip(self.black_midis, self.black_starts, self.black_ends)
+        ]
+        return sorted(keys, key=lambda key: key['midi'])
+
+    def to_json(self):
+        return json.dumps({
+            'first_midi': int(self.first_midi),
+            'white_keys': int(self.white_keys),
+            'width': self.width,
+            'height': self.height,
+            'homography': self.homography.tolist() if self.homography is not None else None,
+            'keys': self.keys()
+        })
+
+    @classmethod
+    def from_json(cls, data):
+        # Los intervalos se recalculan a partir de los parametros; 'keys' es solo informativo
+        if isinstance(data, str):
+            data = json.loads(data)
+        return cls(data['first_midi'], data['white_keys'], data['width'], data['height'], data.get('homography'))
@@ -0,0 +1,121 @@
+import importlib
+import json
+import threading
+import time
+from datetime import datetime
+
+# Importacion diferida de dependencias pesadas (cv2, matplotlib, pandas, music21) y
+# precalentamiento en segundo plano. El primer getModule de cada pantalla ya no paga
+# el import: se hace en el primer uso o, mejor, en start_warmup() al abrir la app.
+
+_modules = {}
+_modules_lock = threading.Lock()
+_import_timings = {}
+
+# Modulos de la app con funcion warmup(), en el orden en que se precalientan
+WARMUP_MODULES = ("calibracion", "progress_charts", "escalas")
+
+_warmup_thread = None
+_warmup_report = None
+_warmup_lock = threading.Lock()
+
+
+class LazyModule:
+    # Se comporta como el modulo `name`; el import real ocurre en el primer acceso a un atributo
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    self._module = importlib.import_module(self._name)
+                    _import_timings[self._name] = (time.perf_counter() - start) * 1000.0
+                module = self._module
+        return module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "cargado" if self.loaded else "diferido"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name):
+    # Un solo proxy por nombre: todos los modulos comparten el mismo import diferido
+    with _modules_lock:
+        module = _modules.get(name)
+        if module is None:
+            module = _modules[name] = LazyModule(name)
+        return module
+
+
+def import_timings():
+    return dict(_import_timings)
+
+
+def run_steps(steps):
+    # Ejecuta (nombre, funcion) en orden y devuelve los milisegundos de cada paso; un paso
+    # que falla queda registrado con su error y no detiene a los siguientes
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+            timings[name] = (time.perf_counter() - start) * 1000.0
+        except Exception as e:
+            timings[name] = {'ms': (time.perf_counter() - start) * 1000.0, 'error': str(e)}
+    return timings
+
+
+def warmup(modules=WARMUP_MODULES):
+    report = {}
+    start = time.perf_counter()
+    for name in modules:
+        import_start = time.perf_counter()
+        try:
+            module = importlib.import_module(name)
+        except Exception as e:
+            report[name] = {'import': {'ms': (time.perf_counter() - import_start) * 1000.0, 'error': str(e)}}
+            continue
+        report[name] = {'import': (time.perf_counter() - import_start) * 1000.0}
+        if hasattr(module, 'warmup'):
+            report[name].update(module.warmup())
+    report['total_ms'] = (time.perf_counter() - start) * 1000.0
+    print(f"[PYTHON LOG {datetime.now().strftime('%H:%M:%S')}] Warmup completado en {report['total_ms']:.0f} ms")
+    return report
+
+
+def start_warmup(modules=WARMUP_MODULES):
+    # Para llamar desde Kotlin al iniciar la app; no bloquea y solo se lanza una vez
+    global _warmup_thread
+
+    def run():
+        global _warmup_report
+        _warmup_report = warmup(modules)
+
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=run, name="python-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+
+def warmup_report(timeout=None):
+    # JSON con los tiempos por modulo y paso; {"running": true} mientras no termine
+    thread = _warmup_thread
+    if thread is not None and timeout is not None:
+        thread.join(timeout)
+    if _warmup_report is None:
+        return json.dumps({'running': thread is not None, 'imports': import_timings()})
+    return json.dumps(dict(_warmup_report, imports=import_timings()))
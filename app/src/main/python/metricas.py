@@ -0,0 +1,254 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date
+
+import numpy as np
+
+import series_tiempo
+
+# Almacen local de metricas de practica (SQLite en el directorio de archivos de la app). Cada
+# resultado se guarda una vez y actualiza en el mismo momento los acumulados por semana y
+# escala y por dia y escala; los graficos leen una ventana ya agregada en lugar de pedir y
+# reprocesar todo el historial.
+VERSION_ESQUEMA = 1
+
+# Campo del resultado (como lo envia Kotlin) -> columna de las tablas
+CAMPOS_RESULTADO = {
+    "erroresPosturales": "errores_posturales",
+    "erroresMusicales": "errores_musicales",
+    "tiempoBuenaPosturaSegundos": "segundos_buena",
+    "tiempoMalaPosturaSegundos": "segundos_mala",
+    "notasCorrectas": "notas_correctas",
+    "notasIncorrectas": "notas_incorrectas",
+}
+METRICAS = tuple(CAMPOS_RESULTADO.values())
+METRICAS_DIARIAS = ("errores_posturales", "errores_musicales")
+
+_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS resultados (
+    id TEXT UNIQUE,
+    dia INTEGER NOT NULL,
+    escala TEXT NOT NULL,
+    {", ".join(f"{metrica} REAL NOT NULL DEFAULT 0" for metrica in METRICAS)}
+);
+CREATE TABLE IF NOT EXISTS semanal (
+    semana INTEGER NOT NULL,
+    escala TEXT NOT NULL,
+    practicas INTEGER NOT NULL DEFAULT 0,
+    {", ".join(f"{metrica} REAL NOT NULL DEFAULT 0" for metrica in METRICAS)},
+    PRIMARY KEY (semana, escala)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS diario (
+    dia INTEGER NOT NULL,
+    escala TEXT NOT NULL,
+    {", ".join(f"{metrica} REAL NOT NULL DEFAULT 0" for metrica in METRICAS_DIARIAS)},
+    PRIMARY KEY (dia, escala)
+) WITHOUT ROWID;
+"""
+
+
+def _upsert(tabla, clave, metricas, practicas=False):
+    columnas = list(clave) + (["practicas"] if practicas else []) + list(metricas)
+    valores = ", ".join("?" for _ in columnas)
+    sumas = ", ".join(f"{columna} = {columna} + excluded.{columna}"
+                      for columna in columnas if columna not in clave)
+    return (f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({valores}) "
+            f"ON CONFLICT({', '.join(clave)}) DO UPDATE SET {sumas}")
+
+
+_UPSERT_SEMANAL = _upsert("semanal", ("semana", "escala"), METRICAS, practicas=True)
+_UPSERT_DIARIO = _upsert("diario", ("dia", "escala"), METRICAS_DIARIAS)
+
+
+def semana_iso(anio, semana):
+    # (anio, semana ISO) como en la API de analytics -> ordinal de series_tiempo (lunes a domingo)
+    lunes = date.fromisocalendar(int(anio), int(semana), 1)
+    return int(series_tiempo.ordinal(np.datetime64(lunes, "D"), "semana"))
+
+
+def _leer_resultados(resultados):
+    # JSON, dict, lista de dicts o ArrayList de java.util.Map con los campos de CAMPOS_RESULTADO
+    # mas "dia", "escala" y opcionalmente "id" (para que registrar dos veces no cuente doble)
+    if isinstance(resultados, str):
+        resultados = json.loads(resultados)
+    if isinstance(resultados, dict) or hasattr(resultados, 'keySet'):
+        resultados = [resultados]
+    if hasattr(resultados, 'toArray'):
+        resultados = list(resultados.toArray())
+    filas = []
+    for resultado in resultados:
+        if hasattr(resultado, 'keySet'):
+            resultado = {str(clave): resultado.get(clave) for clave in resultado.keySet().toArray()}
+        faltantes = [campo for campo in ("dia", "escala") if not resultado.get(campo)]
+        if faltantes:
+            raise ValueError(f"Resultado sin {faltantes}: {resultado}")
+        filas.append(resultado)
+    return filas
+
+
+class MetricasPractica:
+
+    def __init__(self, ruta=":memory:"):
+        self.ruta = ruta
+        if ruta != ":memory:" and os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._lock = threading.Lock()
+        # Una sola conexion compartida por los hilos de la app, serializada con el lock
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        with self._db:
+            if ruta != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_ESQUEMA)
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version != VERSION_ESQUEMA:
+                self._db.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+                if version:
+                    self._reconstruir()
+
+    def cerrar(self):
+        with self._lock:
+            self._db.close()
+
+    def registrar(self, resultados):
+        # Guarda los resultados y suma cada uno a sus acumulados, todo en una transaccion.
+        # Devuelve cuantos se agregaron y cuantos ya estaban (mismo id)
+        filas = _leer_resultados(resultados)
+        if not filas:
+            return {'added': 0, 'duplicates': 0}
+        dias = series_tiempo.a_dias([fila["dia"] for fila in filas])
+        ordinales_dia = series_tiempo.ordinal(dias, "dia").tolist()
+        ordinales_semana = series_tiempo.ordinal(dias, "semana").tolist()
+
+        agregados = 0
+        with self._lock, self._db:
+            for fila, dia, semana in zip(filas, ordinales_dia, ordinales_semana):
+                escala = str(fila["escala"])
+                valores = [float(fila.get(campo) or 0) for campo in CAMPOS_RESULTADO]
+                if fila.get("id") is not None:
+                    cursor = self._db.execute(
+                        f"INSERT OR IGNORE INTO resultados (id, dia, escala, {', '.join(METRICAS)}) "
+                        f"VALUES (?, ?, ?, {', '.join('?' for _ in METRICAS)})",
+                        [str(fila["id"]), dia, escala] + valores)
+                    if not cursor.rowcount:
+                        continue
+                else:
+                    self._db.execute(
+                        f"INSERT INTO resultados (dia, escala, {', '.join(METRICAS)}) "
+                        f"VALUES (?, ?, {', '.join('?' for _ in METRICAS)})",
+                        [dia, escala] + valores)
+                self._db.execute(_UPSERT_SEMANAL, [semana, escala, 1] + valores)
+                self._db.execute(_UPSERT_DIARIO, [dia, escala] + [valores[METRICAS.index(m)] for m in METRICAS_DIARIAS])
+                agregados += 1
+        return {'added': agregados, 'duplicates': len(filas) - agregados}
+
+    def reconstruir(self):
+        # Recalcula los acumulados desde los resultados guardados
+        with self._lock, self._db:
+            self._reconstruir()
+
+    def _reconstruir(self):
+        self._db.execute("DELETE FROM semanal")
+        self._db.execute("DELETE FROM diario")
+        # Mismo ordinal de semana que series_tiempo: (dia + 3) / 7, semanas de lunes a domingo
+        self._db.execute(
+            f"INSERT INTO semanal (semana, escala, practicas, {', '.join(METRICAS)}) "
+            f"SELECT (dia + 3) / 7, escala, COUNT(*), {', '.join(f'SUM({m})' for m in METRICAS)} "
+            f"FROM resultados GROUP BY (dia + 3) / 7, escala")
+        self._db.execute(
+            f"INSERT INTO diario (dia, escala, {', '.join(METRICAS_DIARIAS)}) "
+            f"SELECT dia, escala, {', '.join(f'SUM({m})' for m in METRICAS_DIARIAS)} "
+            f"FROM resultados GROUP BY dia, escala")
+
+    def _consultar(self, sql, parametros):
+        with self._lock:
+            return self._db.execute(sql, parametros).fetchall()
+
+    # Consultas por ventana de `semanas` semanas que termina en (anio, semana). Solo se leen
+    # las filas acumuladas de esa ventana (clave primaria por semana/dia) y se devuelven en
+    # el formato columnar de progress_charts.
+    def _semanas(self, anio, semana, semanas):
+        ultima = semana_iso(anio, semana)
+        return ultima - max(1, int(semanas)) + 1, ultima
+
+    def top_escalas(self, anio, semana, semanas=1, limite=3):
+        filas = self._consultar(
+            "SELECT escala, SUM(practicas) AS total FROM semanal WHERE semana BETWEEN ? AND ? "
+            "GROUP BY escala ORDER BY total DESC, escala LIMIT ?",
+            self._semanas(anio, semana, semanas) + (limite,))
+        return {"escala": [f[0] for f in filas], "vecesPracticada": [int(f[1]) for f in filas]}
+
+    def posturas(self, anio, semana, semanas=1):
+        filas = self._consultar(
+            "SELECT escala, SUM(segundos_mala), SUM(segundos_buena) FROM semanal "
+            "WHERE semana BETWEEN ? AND ? GROUP BY escala "
+            "HAVING SUM(segundos_mala) + SUM(segundos_buena) > 0 ORDER BY escala",
+            self._semanas(anio, semana, semanas))
+        return {"escala": [f[0] for f in filas], "tiempoMalaPosturaSegundos": [f[1] for f in filas],
+                "tiempoBuenaPosturaSegundos": [f[2] for f in filas]}
+
+    def notas(self, anio, semana, semanas=1):
+        filas = self._consultar(
+            "SELECT escala, SUM(notas_correctas), SUM(notas_incorrectas) FROM semanal "
+            "WHERE semana BETWEEN ? AND ? GROUP BY escala "
+            "HAVING SUM(notas_correctas) + SUM(notas_incorrectas) > 0 ORDER BY escala",
+            self._semanas(anio, semana, semanas))
+        return {"escala": [f[0] for f in filas], "notasCorrectas": [int(f[1]) for f in filas],
+                "notasIncorrectas": [int(f[2]) for f in filas]}
+
+    def errores(self, metrica, anio, semana, semanas=1):
+        # Filas por dia y escala, como las de analytics/errores-*-semanales
+        primera, ultima = self._semanas(anio, semana, semanas)
+        campo = {"errores_posturales": "totalErroresPosturales", "errores_musicales": "totalErroresMusicales"}[metrica]
+        filas = self._consultar(
+            f"SELECT dia, escala, {metrica} FROM diario WHERE dia BETWEEN ? AND ? AND {metrica} > 0 ORDER BY dia, escala",
+            (primera * 7 - 3, ultima * 7 + 3))
+        dias = series_tiempo.inicio([f[0] for f in filas], "dia")
+        return {"escala": [f[1] for f in filas], campo: [int(f[2]) for f in filas],
+                "dia": [str(dia) for dia in dias]}
+
+    def dashboard(self, anio, semana, semanas=1):
+        # Los cinco datasets de render_dashboard para la ventana pedida
+        return {
+            "top_escalas": self.top_escalas(anio, semana, semanas),
+            "errores_posturales": self.errores("errores_posturales", anio, semana, semanas),
+            "errores_musicales": self.errores("errores_musicales", anio, semana, semanas),
+            "posturas": self.posturas(anio, semana, semanas),
+            "notas": self.notas(anio, semana, semanas),
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                tabla: self._db.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+                for tabla in ("resultados", "semanal", "diario")
+            }
+
+
+_almacen = None
+_almacen_lock = threading.Lock()
+
+
+def configure_metricas(ruta):
+    # Desde Kotlin al iniciar: configure_metricas(context.filesDir.absolutePath + "/metricas.db")
+    global _almacen
+    with _almacen_lock:
+        if _almacen is not None:
+            _almacen.cerrar()
+        _almacen = MetricasPractica(str(ruta))
+        return json.dumps(_almacen.stats())
+
+
+def almacen():
+    if _almacen is None:
+        raise ValueError("Almacen de metricas sin configurar: llame a configure_metricas")
+    return _almacen
+
+
+def registrar_resultados(resultados):
+    return json.dumps(almacen().registrar(resultados))
+
+
+def dashboard_semana(anio, semana, semanas=1):
+    return json.dumps(almacen().dashboard(anio, semana, semanas))
@@ -1,4 +1,6 @@
-from music21 import scale
+from lazy_imports import lazy_import
+
+scale = lazy_import("music21.scale")
 
 solfege_note_dict = {
     "Do": "C",
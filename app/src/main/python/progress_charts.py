@@ -1,13 +1,81 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import pandas as pd
 from datetime import datetime
 import io
 import base64
+import hashlib
+import json
+import os
 import threading
-import time
-
-_graph_lock = threading.Lock()
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import metricas
+import series_tiempo
+from lazy_imports import lazy_import, run_steps
+
+# matplotlib se importa en el primer grafico (o en warmup): construir la cache de fuentes
+# de matplotlib tarda varios segundos en el primer arranque. Se usa la API de objetos
+# (Figure + canvas Agg) y nunca pyplot, asi no hay estado global entre graficos. Con
+# salida="spec" no se importa nunca. numpy si se importa al cargar el modulo: lo usan
+# todos los graficos (tambien el spec) y series_tiempo y metricas ya lo necesitan
+figure = lazy_import("matplotlib.figure")
+backend_agg = lazy_import("matplotlib.backends.backend_agg")
+font_manager = lazy_import("matplotlib.font_manager")
+
+# Campos de cada grafico: columna -> (getter del objeto Java, tipo). Los graficos aceptan la
+# lista de objetos de siempre o un payload columnar con estas mismas columnas
+CAMPOS_TOP_ESCALAS = {
+    "escala": ("getEscala", "str"),
+    "vecesPracticada": ("getVecesPracticada", "int"),
+}
+CAMPOS_ERRORES_POSTURALES = {
+    "escala": ("getEscala", "str"),
+    "totalErroresPosturales": ("getTotalErroresPosturales", "int"),
+    "dia": ("getDia", "str"),
+}
+CAMPOS_ERRORES_MUSICALES = {
+    "escala": ("getEscala", "str"),
+    "totalErroresMusicales": ("getTotalErroresMusicales", "int"),
+    "dia": ("getDia", "str"),
+}
+CAMPOS_POSTURAS = {
+    "escala": ("getEscala", "str"),
+    "tiempoMalaPosturaSegundos": ("getTiempoMalaPosturaSegundos", "float"),
+    "tiempoBuenaPosturaSegundos": ("getTiempoBuenaPosturaSegundos", "float"),
+}
+CAMPOS_NOTAS = {
+    "escala": ("getEscala", "str"),
+    "notasCorrectas": ("getNotasCorrectas", "int"),
+    "notasIncorrectas": ("getNotasIncorrectas", "int"),
+}
+# Columnas numericas empaquetadas como bytes (little-endian): IntArray -> int32, DoubleArray -> float64
+TIPOS_EMPAQUETADOS = {"int": "<i4", "float": "<f8"}
+TIPOS_NUMPY = {"int": "int64", "float": "float64"}
+# Cache de graficos: presupuesto en memoria y en disco (bytes). Subir la version invalida
+# las imagenes guardadas cuando cambia el estilo de algun grafico
+CACHE_MEMORIA_BYTES = 8 * 1024 * 1024
+CACHE_DISCO_BYTES = 32 * 1024 * 1024
+CACHE_VERSION = 3
+# Plantillas de figuras reutilizadas entre renders, una por grafico y cantidad de barras.
+# Cada una retiene el buffer RGBA del renderer Agg (ancho * alto * 4 bytes), por eso ademas
+# de la cantidad se limita la memoria total
+MAX_PLANTILLAS = 16
+MAX_PLANTILLAS_BYTES = 24 * 1024 * 1024
+# Hilos para renderizar graficos independientes en paralelo (render_charts)
+RENDER_MAX_WORKERS = max(1, min(5, os.cpu_count() or 1))
+# Salida de los graficos: bytes crudos de la imagen (BitmapFactory.decodeByteArray los lee
+# directo) o, solo por compatibilidad, la cadena base64 de antes
+SALIDA_PNG = "png"
+SALIDA_BASE64 = "base64"
+# JSON con lo que se dibujaria (barras, colores, rangos y etiquetas) para dibujarlo nativo
+SALIDA_SPEC = "spec"
+# Opciones de imagen: tamano exacto en pixeles del ImageView, densidad de pantalla (1 dp =
+# densidad px) y codificacion. Los graficos se disenaron a 100 dpi con densidad 1
+OPCIONES_IMAGEN = ("ancho", "alto", "densidad", "formato", "compresion", "calidad")
+FORMATOS_IMAGEN = {"png": "png", "webp": "webp", "jpeg": "jpeg", "jpg": "jpeg"}
+EXTENSIONES_IMAGEN = {"png": "png", "webp": "webp", "jpeg": "jpg"}
+DPI_BASE = 100
 
 
 def _convertir_a_lista_python(datos):
@@ -17,431 +85,1082 @@ def _convertir_a_lista_python(datos):
     return datos
 
 
-def _mostrar_y_guardar(nombre, fig):
-    time.sleep(0.05)
+def _es_columnar(datos):
+    # JSON con una lista por columna, dict de columnas o java.util.Map
+    return isinstance(datos, (str, dict)) or hasattr(datos, 'keySet')
+
+
+def _columna_numpy(valor, tipo):
+    if hasattr(valor, 'toArray'):
+        valor = list(valor.toArray())
+    if tipo == "str":
+        # Una sola cadena separada por saltos de linea o un arreglo de cadenas
+        if isinstance(valor, str):
+            valor = valor.split("\n") if valor else []
+        return np.array([str(v) for v in valor], dtype=object)
+    if _es_empaquetada(valor):
+        return np.frombuffer(valor, TIPOS_EMPAQUETADOS[tipo]).astype(TIPOS_NUMPY[tipo])
+    # Listas y arreglos primitivos de Java (protocolo buffer) se convierten en bloque
+    return np.asarray(valor).astype(TIPOS_NUMPY[tipo])
+
+
+def _es_empaquetada(valor):
+    # bytes de Python o un ByteArray de Kotlin: Chaquopy lo entrega como jarray, que no es
+    # bytes pero expone un buffer de 1 byte por elemento (np.asarray lo leeria como int8)
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return True
+    if isinstance(valor, (str, list, tuple, np.ndarray)):
+        return False
+    try:
+        return memoryview(valor).itemsize == 1
+    except TypeError:
+        return False
+
+
+def _leer_columnas(datos, campos):
+    # Devuelve {columna: arreglo numpy} o None si no hay filas. El payload columnar cruza el
+    # puente una vez por columna; la lista de objetos conserva el camino original por getters.
+    if _es_columnar(datos):
+        if isinstance(datos, str):
+            datos = json.loads(datos) if datos.strip() else {}
+        elif not isinstance(datos, dict):
+            datos = {str(clave): datos.get(clave) for clave in datos.keySet().toArray()}
+        faltantes = [nombre for nombre in campos if nombre not in datos]
+        if faltantes and datos:
+            raise ValueError(f"Faltan columnas en el payload: {faltantes}")
+        columnas = {nombre: _columna_numpy(datos.get(nombre, []), tipo) for nombre, (_, tipo) in campos.items()}
+    else:
+        datos = _convertir_a_lista_python(datos)
+        if not datos:
+            return None
+        convertir = {"str": str, "int": int, "float": float}
+        columnas = {
+            nombre: _columna_numpy([convertir[tipo](getattr(item, getter)()) for item in datos], tipo)
+            for nombre, (getter, tipo) in campos.items()
+        }
+
+    largos = {nombre: len(columna) for nombre, columna in columnas.items()}
+    if len(set(largos.values())) > 1:
+        raise ValueError(f"Columnas de distinto largo: {largos}")
+    if not any(largos.values()):
+        return None
+    return columnas
+
+
+def _leer_opciones_imagen(imagen):
+    # dict, JSON o java.util.Map con OPCIONES_IMAGEN; devuelve un dict normalizado (solo las
+    # opciones presentes) o None para el PNG por defecto de siempre
+    if imagen is None:
+        return None
+    if isinstance(imagen, str):
+        imagen = json.loads(imagen) if imagen.strip() else {}
+    elif hasattr(imagen, 'keySet'):
+        imagen = {str(clave): imagen.get(clave) for clave in imagen.keySet().toArray()}
+    desconocidas = [clave for clave in imagen if clave not in OPCIONES_IMAGEN]
+    if desconocidas:
+        raise ValueError(f"Opciones de imagen desconocidas: {desconocidas}")
+
+    opciones = {}
+    for clave in ("ancho", "alto", "compresion", "calidad"):
+        if imagen.get(clave) is not None:
+            opciones[clave] = int(imagen[clave])
+    if imagen.get("densidad") is not None:
+        opciones["densidad"] = float(imagen["densidad"])
+    formato = str(imagen.get("formato") or "png").lower()
+    if formato not in FORMATOS_IMAGEN:
+        raise ValueError(f"Formato de imagen desconocido: {formato}")
+    opciones["formato"] = FORMATOS_IMAGEN[formato]
+
+    if opciones.get("ancho", 1) <= 0 or opciones.get("alto", 1) <= 0 or opciones.get("densidad", 1) <= 0:
+        raise ValueError(f"Tamano de imagen invalido: {imagen}")
+    if not 0 <= opciones.get("compresion", 0) <= 9:
+        raise ValueError("La compresion PNG va de 0 (mas rapido) a 9 (mas chico)")
+    if not 1 <= opciones.get("calidad", 1) <= 100:
+        raise ValueError("La calidad WebP/JPEG va de 1 a 100")
+    return opciones
+
+
+def _lienzo(figsize, opciones):
+    # (figsize, dpi) para que la figura salga con el tamano exacto pedido. Sin densidad se
+    # escala el diseno original; con densidad el texto mantiene su tamano en dp
+    if not opciones:
+        return figsize, None
+    ancho, alto = opciones.get("ancho"), opciones.get("alto")
+    dpi = DPI_BASE * opciones["densidad"] if "densidad" in opciones else None
+    if ancho is None and alto is None:
+        return figsize, dpi
+    if ancho is None:
+        ancho = round(alto * figsize[0] / figsize[1])
+    if alto is None:
+        alto = round(ancho * figsize[1] / figsize[0])
+    if dpi is None:
+        dpi = ancho / figsize[0]
+    return (ancho / dpi, alto / dpi), dpi
+
+
+class RenderCache:
+    # LRU en memoria con presupuesto en bytes y un nivel opcional en disco (el directorio de
+    # cache de la app). La clave es el tipo de grafico mas un hash de las columnas
+    # normalizadas y de las opciones de render: volver a una semana ya vista o rotar el
+    # dispositivo cuesta una busqueda en lugar de un render de matplotlib.
+
+    def __init__(self, max_bytes=CACHE_MEMORIA_BYTES, directorio=None, max_bytes_disco=CACHE_DISCO_BYTES):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(tipo, columnas, opciones=None):
+        h = hashlib.sha256(f"{CACHE_VERSION}:{tipo}:".encode("utf-8"))
+        for nombre in sorted(columnas):
+            columna = columnas[nombre]
+            h.update(nombre.encode("utf-8"))
+            if columna.dtype == object:
+                h.update("\x1f".join(columna).encode("utf-8"))
+            else:
+                h.update(columna.dtype.str.encode("ascii"))
+                h.update(np.ascontiguousarray(columna).tobytes())
+            h.update(b"\x1e")
+        h.update(json.dumps(opciones or {}, sort_keys=True).encode("utf-8"))
+        return f"{tipo}-{h.hexdigest()[:32]}"
+
+    def _ruta(self, clave, valor=None):
+        # .b64 para cadenas base64 y .bin para bytes crudos
+        if valor is None:
+            for extension in (".b64", ".bin"):
+                ruta = os.path.join(self.directorio, clave + extension)
+                if os.path.exists(ruta):
+                    return ruta
+            return None
+        return os.path.join(self.directorio, clave + (".b64" if isinstance(valor, str) else ".bin"))
+
+    def get(self, clave):
+        with self._lock:
+            valor = self._entradas.get(clave)
+            if valor is not None:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return valor
+        valor = self._leer_disco(clave)
+        with self._lock:
+            if valor is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._guardar_memoria(clave, valor)
+        return valor
+
+    def put(self, clave, valor):
+        if valor is None:
+            return
+        with self._lock:
+            self._guardar_memoria(clave, valor)
+        self._escribir_disco(clave, valor)
+
+    def _guardar_memoria(self, clave, valor):
+        tamano = len(valor)
+        if tamano > self.max_bytes:
+            return
+        anterior = self._entradas.pop(clave, None)
+        if anterior is not None:
+            self._bytes -= len(anterior)
+        self._entradas[clave] = valor
+        self._bytes += tamano
+        while self._bytes > self.max_bytes:
+            _, expulsado = self._entradas.popitem(last=False)
+            self._bytes -= len(expulsado)
+            self.evictions += 1
+
+    def _leer_disco(self, clave):
+        if not self.directorio:
+            return None
+        ruta = self._ruta(clave)
+        if ruta is None:
+            return None
+        try:
+            with open(ruta, "rb") as f:
+                contenido = f.read()
+            os.utime(ruta)
+        except OSError:
+            return None
+        return contenido.decode("ascii") if ruta.endswith(".b64") else contenido
+
+    def _escribir_disco(self, clave, valor):
+        if not self.directorio:
+            return
+        ruta = self._ruta(clave, valor)
+        temporal = f"{ruta}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "wb") as f:
+                f.write(valor.encode("ascii") if isinstance(valor, str) else valor)
+            os.replace(temporal, ruta)
+            self._podar_disco()
+        except OSError as e:
+            print(f"[PYTHON LOG] ⚠️ No se pudo guardar el grafico en cache: {e}")
+
+    def _podar_disco(self):
+        # Borra los archivos usados hace mas tiempo hasta quedar dentro del presupuesto
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith((".b64", ".bin")):
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((estado.st_mtime, estado.st_size, ruta))
+        total = sum(tamano for _, tamano, _ in archivos)
+        borrados = 0
+        for _, tamano, ruta in sorted(archivos):
+            if total <= self.max_bytes_disco:
+                break
+            try:
+                os.remove(ruta)
+                borrados += 1
+            except FileNotFoundError:
+                # Otro hilo podando al mismo tiempo ya lo borro (y lo conto)
+                pass
+            total -= tamano
+        # El contador se comparte con la expulsion en memoria y stats(): se suma bajo el lock
+        with self._lock:
+            self.evictions += borrados
+
+    def clear(self, disco=False):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+        if disco and self.directorio:
+            for nombre in os.listdir(self.directorio):
+                if nombre.endswith((".b64", ".bin")):
+                    os.remove(os.path.join(self.directorio, nombre))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entradas),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+render_cache = RenderCache()
+
+
+def configure_render_cache(directorio=None, max_bytes=CACHE_MEMORIA_BYTES, max_bytes_disco=CACHE_DISCO_BYTES):
+    # Desde Kotlin al iniciar: configure_render_cache(context.cacheDir.absolutePath + "/graficos")
+    global render_cache
+    render_cache = RenderCache(max_bytes, str(directorio) if directorio else None, max_bytes_disco)
+    return render_cache_stats()
+
+
+def render_cache_stats():
+    return json.dumps(render_cache.stats())
+
+
+def _graficar(tipo, columnas, render, opciones=None, imagen=None):
+    cache = render_cache
+    clave = cache.clave(tipo, columnas, dict(opciones or {}, imagen=imagen) if imagen else opciones)
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = render(columnas, imagen)
+        cache.put(clave, resultado)
+    return resultado
+
+
+def _nueva_figura(figsize, **kwargs):
+    # Figura independiente con su propio canvas Agg: cada hilo dibuja la suya sin lock.
+    # matplotlib ya mantiene las fuentes FreeType por hilo, lo unico compartido.
+    fig = figure.Figure(figsize=figsize, **kwargs)
+    backend_agg.FigureCanvasAgg(fig)
+    return fig, fig.subplots()
+
+
+def _mostrar_y_guardar(nombre, fig, imagen=None):
+    # PNG con la compresion de Pillow (0 codifica mas rapido, 9 pesa menos) o WebP/JPEG con calidad
+    imagen = imagen or {}
+    formato = imagen.get("formato", "png")
+    if formato == "png":
+        pil_kwargs = {"compress_level": imagen["compresion"]} if "compresion" in imagen else None
+    else:
+        pil_kwargs = {"quality": imagen["calidad"]} if "calidad" in imagen else None
     buffer = io.BytesIO()
-    fig.savefig(buffer, format="png")
-    buffer.seek(0)
-    img_str = base64.b64encode(buffer.getvalue()).decode("utf-8")
-    plt.close(fig)
+    fig.savefig(buffer, format=formato, pil_kwargs=pil_kwargs)
     print(f"[PYTHON LOG {datetime.now().strftime('%H:%M:%S')}] ✅ Gráfico '{nombre}' generado correctamente")
-    return img_str
+    return buffer.getvalue()
+
+
+def _entregar(png, salida=SALIDA_PNG, destino=None):
+    # `destino` puede ser una ruta de archivo (se devuelve la ruta), un ByteBuffer de Kotlin
+    # (objeto con put) o cualquier buffer escribible de Python (se devuelve el largo escrito)
+    if destino is not None:
+        if isinstance(destino, (str, os.PathLike)):
+            with open(destino, "wb") as f:
+                f.write(png)
+            return str(destino)
+        if hasattr(destino, 'put'):
+            destino.put(png)
+            return len(png)
+        vista = memoryview(destino).cast("B")
+        if vista.nbytes < len(png):
+            raise ValueError(f"El buffer de destino tiene {vista.nbytes} bytes, el PNG ocupa {len(png)}")
+        vista[:len(png)] = png
+        return len(png)
+    if salida == SALIDA_PNG:
+        return png
+    if salida == SALIDA_BASE64:
+        return base64.b64encode(png).decode("ascii")
+    raise ValueError(f"Salida desconocida: {salida}")
 
-def _grafico_sin_datos(nombre, mensaje="Sin datos disponibles"):
-    fig, ax = plt.subplots(figsize=(4, 3))
-    ax.text(0.5, 0.5, mensaje, ha="center", va="center",
-            fontsize=12, color="gray", fontweight="bold")
-    ax.axis("off")
-    return _mostrar_y_guardar(nombre, fig)
 
-def top_escalas_graph(datos):
-    with _graph_lock:
-        try:
-            print(f"[PYTHON LOG {datetime.now().strftime('%H:%M:%S')}] 🔸 Llamada a top_escalas_graph")
-
-            datos = _convertir_a_lista_python(datos)
-
-            if not datos:
-                print("[PYTHON LOG] ⚠️ Lista vacía recibida en top_escalas_graph.")
-                return _grafico_sin_datos("errores_posturales")
-
-            datos = [dict(
-                escala=str(item.getEscala()),
-                vecesPracticada=int(item.getVecesPracticada())
-            ) for item in datos]
-
-            df = pd.DataFrame(datos)
-            df = df.sort_values(by="vecesPracticada", ascending=False).reset_index(drop=True)
-
-            # Reordenar si hay al menos 3 valores
-            if len(df) >= 3:
-                orden_podio = [1, 0, 2]
-                df = df.iloc[orden_podio]
-
-            colores_podio = ["#a7b9e6", "#7b001c", "#b9824d"]
-            colores = (colores_podio * (len(df)//3 + 1))[:len(df)]
-
-            fig, ax = plt.subplots(figsize=(4.5, 3.5))
-            bars = ax.bar(df["escala"], df["vecesPracticada"], color=colores, edgecolor="black")
-
-            # Limpieza visual
-            ax.set_ylabel("")
-            ax.set_xlabel("")
-            ax.spines["top"].set_visible(False)
-            ax.spines["right"].set_visible(False)
-            ax.spines["left"].set_visible(False)
-            ax.spines["bottom"].set_visible(False)
-            ax.tick_params(left=False, bottom=False)
-            ax.set_yticks([])
-
-            # Generar etiquetas dinámicamente
-            if len(df) >= 3:
-                posiciones = [2, 1, 3]  # estilo podio
+# ==========================================================
+# 🔹 Plantillas de graficos
+# ==========================================================
+class PlantillaGrafico:
+    # Cada grafico se describe primero como un spec (barras, apilado, colores, rangos de los
+    # ejes, etiquetas y anotaciones) calculado solo con numpy. salida="spec" devuelve ese
+    # JSON para que la UI lo dibuje nativa, sin importar matplotlib.
+    #
+    # Para el bitmap, la figura y los ejes se construyen una sola vez por cantidad de barras:
+    # estilo, spines, leyendas y titulos quedan fijos y cada render solo aplica el spec a los
+    # artistas ya creados. tight_layout (de lo mas lento de matplotlib) solo se vuelve a
+    # calcular cuando cambia el largo de las etiquetas de los ejes (firma_layout).
+    tipo = None
+    figsize = (4, 3)
+    figura_kw = {}
+
+    def __init__(self, n, figsize=None, dpi=None):
+        self.n = n
+        self.renders = 0
+        self.layouts = 0
+        self.firma = None
+        self.lock = threading.Lock()
+        self.series = []
+        self.anotaciones = []
+        self.fig, self.ax = _nueva_figura(figsize=figsize or self.figsize, dpi=dpi, **self.figura_kw)
+        self.construir()
+        parametros = self.fig.subplotpars
+        self.margenes = {lado: getattr(parametros, lado) for lado in ("left", "bottom", "right", "top")}
+        ancho, alto = self.fig.canvas.get_width_height()
+        self.bytes = int(ancho) * int(alto) * 4
+
+    # `opciones` son los parametros propios de cada grafico (p. ej. el intervalo de los errores)
+    @classmethod
+    def tamano(cls, columnas, opciones=None):
+        return len(next(iter(columnas.values())))
+
+    @classmethod
+    def spec(cls, columnas, opciones=None):
+        raise NotImplementedError
+
+    @classmethod
+    def _spec_base(cls, orientacion, ejes, series, anotaciones=(), titulo=None, **extra):
+        return dict({
+            'tipo': cls.tipo,
+            'tamano': [cls.figsize[0] * DPI_BASE, cls.figsize[1] * DPI_BASE],
+            'orientacion': orientacion,
+            'titulo': titulo,
+            'ejes': ejes,
+            'series': list(series),
+            'anotaciones': list(anotaciones)
+        }, **extra)
+
+    def construir(self):
+        pass
+
+    def ajustar_layout(self):
+        pass
+
+    def _tight_layout(self, pad):
+        # tight_layout parte de los margenes actuales: siempre se calcula desde los de la
+        # figura recien construida para que no dependa de los renders anteriores
+        self.fig.subplots_adjust(**self.margenes)
+        self.fig.tight_layout(pad=pad)
+
+    @staticmethod
+    def firma_layout(spec):
+        # Largo (en caracteres) de la etiqueta mas larga de cada eje; con ticks automaticos,
+        # los digitos del limite superior
+        firma = []
+        for eje in spec.get('ejes', ()):
+            ticks = spec['ejes'][eje]['ticks']
+            if ticks is None:
+                firma.append(len(str(int(abs(spec['ejes'][eje]['rango'][1])))))
             else:
-                # Si hay 1 o 2, usar 1, 2...
-                posiciones = list(range(1, len(df) + 1))
-
-            for i, bar in enumerate(bars):
-                ax.text(
-                    bar.get_x() + bar.get_width() / 2,
-                    0.05,
-                    f"{posiciones[i]}",
-                    ha='center',
-                    va='bottom',
-                    color='black',
-                    fontsize=11,
-                    fontweight='bold',
-                    bbox=dict(facecolor='white', edgecolor='black', boxstyle='circle')
-                )
-
-            plt.tight_layout(pad=0.5)
-
-            return _mostrar_y_guardar("top_escalas", fig)
+                firma.append(max((len(texto) for _, texto in ticks), default=0))
+        return tuple(firma)
+
+    def actualizar(self, columnas, opciones=None):
+        spec = self.spec(columnas, opciones)
+        ax = self.ax
+        vertical = spec['orientacion'] == "vertical"
+        for barras, serie in zip(self.series, spec['series']):
+            mitad = serie['grosor'] / 2
+            for barra, posicion, inicio, valor in zip(barras, serie['posiciones'], serie['inicios'], serie['valores']):
+                if vertical:
+                    barra.set_x(posicion - mitad)
+                    barra.set_y(inicio)
+                    barra.set_height(valor)
+                else:
+                    barra.set_y(posicion - mitad)
+                    barra.set_x(inicio)
+                    barra.set_width(valor)
+        for texto, anotacion in zip(self.anotaciones, spec['anotaciones']):
+            texto.set_position((anotacion['x'], anotacion['y']))
+            texto.set_text(anotacion['texto'])
+
+        ax.set_xlim(*spec['ejes']['x']['rango'])
+        ax.set_ylim(*spec['ejes']['y']['rango'])
+        # ticks None: los elige matplotlib (la UI nativa hace lo mismo con sus propias reglas)
+        for ticks, set_ticks in ((spec['ejes']['x']['ticks'], ax.set_xticks),
+                                 (spec['ejes']['y']['ticks'], ax.set_yticks)):
+            if ticks is not None:
+                set_ticks([valor for valor, _ in ticks], [texto for _, texto in ticks])
+        return spec
+
+    def dibujar(self, columnas, nombre=None, imagen=None, opciones=None):
+        with self.lock:
+            firma = self.firma_layout(self.actualizar(columnas, opciones))
+            if firma != self.firma:
+                self.ajustar_layout()
+                self.firma = firma
+                self.layouts += 1
+            self.renders += 1
+            return _mostrar_y_guardar(nombre or self.tipo, self.fig, imagen)
+
+
+def _rango_categorias(n, grosor):
+    # El mismo rango que el autoescalado de matplotlib para barras en 0..n-1 (5% de margen)
+    inicio, fin = -grosor / 2, n - 1 + grosor / 2
+    margen = (fin - inicio) * 0.05
+    return [inicio - margen, fin + margen]
+
+
+def _serie(posiciones, inicios, valores, grosor, colores, nombre=None, borde=None, alfa=1.0):
+    return {
+        'nombre': nombre,
+        'colores': list(colores),
+        'borde': borde,
+        'alfa': alfa,
+        'grosor': grosor,
+        'posiciones': np.asarray(posiciones, np.float64).tolist(),
+        'inicios': np.asarray(inicios, np.float64).tolist(),
+        'valores': np.asarray(valores, np.float64).tolist()
+    }
+
+
+_plantillas = OrderedDict()
+_plantillas_lock = threading.Lock()
+_plantillas_config = {'activas': True, 'max': MAX_PLANTILLAS, 'max_bytes': MAX_PLANTILLAS_BYTES}
+_plantillas_stats = {'created': 0, 'reused': 0, 'evicted': 0}
+
+
+def configure_plantillas(activas=True, max_plantillas=MAX_PLANTILLAS, max_bytes=MAX_PLANTILLAS_BYTES):
+    # activas=False vuelve a construir la figura completa en cada render
+    with _plantillas_lock:
+        _plantillas_config.update(activas=bool(activas), max=max_plantillas, max_bytes=max_bytes)
+        _plantillas.clear()
+        _plantillas_stats.update(created=0, reused=0, evicted=0)
+    return plantillas_stats()
+
+
+def _plantillas_bytes():
+    return sum(plantilla.bytes for plantilla in _plantillas.values())
+
+
+def plantillas_stats():
+    with _plantillas_lock:
+        return json.dumps(dict(_plantillas_stats, entries=len(_plantillas), bytes=_plantillas_bytes(),
+                               enabled=_plantillas_config['activas']))
+
+
+def _dibujar(clase, columnas, nombre=None, imagen=None, opciones=None):
+    # Una plantilla por grafico, cantidad de barras y tamano de figura
+    n = clase.tamano(columnas, opciones)
+    figsize, dpi = _lienzo(clase.figsize, imagen)
+    if not _plantillas_config['activas']:
+        return clase(n, figsize, dpi).dibujar(columnas, nombre, imagen, opciones)
+
+    clave = (clase.tipo, n, figsize, dpi)
+    with _plantillas_lock:
+        plantilla = _plantillas.get(clave)
+        if plantilla is not None:
+            _plantillas.move_to_end(clave)
+            _plantillas_stats['reused'] += 1
+    if plantilla is None:
+        # La figura se construye fuera del lock para no frenar a los otros hilos del panel
+        nueva = clase(n, figsize, dpi)
+        with _plantillas_lock:
+            plantilla = _plantillas.setdefault(clave, nueva)
+            _plantillas_stats['created' if plantilla is nueva else 'reused'] += 1
+            # Se descartan las menos usadas, pero siempre queda al menos la recien usada
+            while len(_plantillas) > 1 and (len(_plantillas) > _plantillas_config['max']
+                                            or _plantillas_bytes() > _plantillas_config['max_bytes']):
+                _plantillas.popitem(last=False)
+                _plantillas_stats['evicted'] += 1
+    return plantilla.dibujar(columnas, nombre, imagen, opciones)
+
+
+def _grafico(clase, columnas, salida=SALIDA_PNG, destino=None, imagen=None, opciones=None):
+    # salida="spec" nunca pasa por matplotlib ni por la cache de imagenes
+    if salida == SALIDA_SPEC:
+        spec = json.dumps(clase.spec(columnas, opciones))
+        return spec if destino is None else _entregar(spec.encode("utf-8"), SALIDA_PNG, destino)
+
+    def render(columnas, imagen):
+        return _dibujar(clase, columnas, imagen=imagen, opciones=opciones)
+
+    return _entregar(_graficar(clase.tipo, columnas, render, opciones, imagen), salida, destino)
+
+
+def _grafico_sin_datos(salida=SALIDA_PNG, destino=None, imagen=None, mensaje="Sin datos disponibles"):
+    return _grafico(PlantillaSinDatos, {"mensaje": np.array([mensaje], dtype=object)}, salida, destino, imagen)
+
+
+class PlantillaSinDatos(PlantillaGrafico):
+    tipo = "sin_datos"
+
+    @classmethod
+    def tamano(cls, columnas, opciones=None):
+        return 0
+
+    @classmethod
+    def spec(cls, columnas, opciones=None):
+        return {'tipo': cls.tipo, 'tamano': [cls.figsize[0] * DPI_BASE, cls.figsize[1] * DPI_BASE],
+                'mensaje': str(columnas["mensaje"][0])}
+
+    def construir(self):
+        self.texto = self.ax.text(0.5, 0.5, "", ha="center", va="center",
+                                  fontsize=12, color="gray", fontweight="bold")
+        self.ax.axis("off")
+
+    def actualizar(self, columnas, opciones=None):
+        spec = self.spec(columnas)
+        self.texto.set_text(spec['mensaje'])
+        return spec
+
+
+def top_escalas_graph(datos, salida=SALIDA_PNG, destino=None, imagen=None):
+    try:
+        imagen = _leer_opciones_imagen(imagen)
+        print(f"[PYTHON LOG {datetime.now().strftime('%H:%M:%S')}] 🔸 Llamada a top_escalas_graph")
+
+        columnas = _leer_columnas(datos, CAMPOS_TOP_ESCALAS)
+
+        if columnas is None:
+            print("[PYTHON LOG] ⚠️ Lista vacía recibida en top_escalas_graph.")
+            return _grafico_sin_datos(salida, destino, imagen)
+
+        return _grafico(PlantillaTopEscalas, columnas, salida, destino, imagen)
+    except Exception as e:
+        print(f"[PYTHON LOG] ❌ Error en top_escalas_graph: {e}")
+
+
+class PlantillaTopEscalas(PlantillaGrafico):
+    tipo = "top_escalas"
+    figsize = (4.5, 3.5)
+    COLORES_PODIO = ["#a7b9e6", "#7b001c", "#b9824d"]
+    GROSOR = 0.8
+
+    @classmethod
+    def tamano(cls, columnas, opciones=None):
+        # Solo se muestra el podio
+        return min(len(columnas["escala"]), 3)
+
+    @classmethod
+    def spec(cls, columnas, opciones=None):
+        n = cls.tamano(columnas)
+        orden = np.argsort(-columnas["vecesPracticada"], kind="stable")[:n]
+        # Reordenar si hay al menos 3 valores: el primero al centro
+        if n >= 3:
+            orden = orden[[1, 0, 2]]
+        alturas = columnas["vecesPracticada"][orden]
+        # Etiquetas estilo podio (2, 1, 3); si hay 1 o 2, usar 1, 2...
+        puestos = [2, 1, 3] if n >= 3 else list(range(1, n + 1))
+        posiciones = np.arange(n)
+        colores = (cls.COLORES_PODIO * (n // 3 + 1))[:n]
+
+        return cls._spec_base(
+            "vertical",
+            {
+                'x': {'rango': _rango_categorias(n, cls.GROSOR), 'etiqueta': "",
+                      'ticks': [[int(i), str(escala)] for i, escala in zip(posiciones, columnas["escala"][orden])]},
+                'y': {'rango': [0.0, float(max(alturas.max(), 1) * 1.05)], 'etiqueta': "", 'ticks': []},
+            },
+            [_serie(posiciones, np.zeros(n), alturas, cls.GROSOR, colores, borde="black")],
+            [{'x': float(i), 'y': 0.05, 'texto': str(puesto), 'estilo': "podio"}
+             for i, puesto in zip(posiciones, puestos)]
+        )
+
+    def construir(self):
+        ax = self.ax
+        colores = (self.COLORES_PODIO * (self.n // 3 + 1))[:self.n]
+        self.series = [ax.bar(np.arange(self.n), np.zeros(self.n), width=self.GROSOR, color=colores,
+                              edgecolor="black")]
+
+        # Limpieza visual
+        ax.set_ylabel("")
+        ax.set_xlabel("")
+        for lado in ("top", "right", "left", "bottom"):
+            ax.spines[lado].set_visible(False)
+        ax.tick_params(left=False, bottom=False)
+
+        self.anotaciones = [
+            ax.text(
+                0,
+                0.05,
+                "",
+                ha='center',
+                va='bottom',
+                color='black',
+                fontsize=11,
+                fontweight='bold',
+                bbox=dict(facecolor='white', edgecolor='black', boxstyle='circle')
+            )
+            for _ in range(self.n)
+        ]
 
-        except Exception as e:
-            print(f"[PYTHON LOG] ❌ Error en top_escalas_graph: {e}")
+    def ajustar_layout(self):
+        self._tight_layout(0.5)
 
 
 # ==========================================================
 # 🔹 2. Errores Posturales
 # ==========================================================
-def errores_posturales_graph(datos):
-    with _graph_lock:
-        try:
-            print(f"[PYTHON LOG] 🔸 Llamada a errores_posturales_graph")
-            print(f"[PYTHON LOG] Datos recibidos: {datos}")
-
-            datos = _convertir_a_lista_python(datos)
-
-            if not datos:
-                print("[PYTHON LOG] ⚠️ Lista vacía recibida en errores_posturales_graph.")
-                return _grafico_sin_datos("errores_posturales")
-
-            datos_procesados = [dict(
-                escala=str(item.getEscala()),
-                totalErroresPosturales=int(item.getTotalErroresPosturales()),
-                dia=str(item.getDia())
-            ) for item in datos]
-
-            df = pd.DataFrame(datos_procesados)
-            print(f"[PYTHON LOG] DataFrame creado:\n{df}")
+def errores_posturales_graph(datos, salida=SALIDA_PNG, destino=None, imagen=None, intervalo=None,
+                             max_barras=series_tiempo.MAX_BARRAS):
+    try:
+        imagen = _leer_opciones_imagen(imagen)
+        print(f"[PYTHON LOG] 🔸 Llamada a errores_posturales_graph")
+        print(f"[PYTHON LOG] Datos recibidos: {datos}")
+
+        columnas = _leer_columnas(datos, CAMPOS_ERRORES_POSTURALES)
+
+        if columnas is None:
+            print("[PYTHON LOG] ⚠️ Lista vacía recibida en errores_posturales_graph.")
+            return _grafico_sin_datos(salida, destino, imagen)
+
+        return _grafico(PlantillaErroresPosturales, columnas, salida, destino, imagen, _opciones_errores(intervalo, max_barras))
+    except Exception as e:
+        print(f"[PYTHON LOG] ❌ Error en errores_posturales_graph: {e}")
+
+
+def _opciones_errores(intervalo, max_barras):
+    # intervalo: "dia", "semana", "mes", "trimestre", "anio" o None (automatico segun el rango)
+    if intervalo is not None and intervalo not in series_tiempo.INTERVALOS:
+        raise ValueError(f"Intervalo desconocido: {intervalo}")
+    if int(max_barras) < 1:
+        raise ValueError("max_barras debe ser al menos 1")
+    return {"intervalo": intervalo, "max_barras": int(max_barras)}
+
+
+class PlantillaErrores(PlantillaGrafico):
+    # Errores posturales o musicales sumados por dia, semana, mes... (series_tiempo). Con
+    # meses de historial la cantidad de barras, etiquetas y ticks no pasa de max_barras, asi
+    # que el costo del render no crece con el historial.
+    figsize = (7, 4)
+    figura_kw = {"facecolor": "white"}
+    columna = None
+    titulo = None
+    BAR_COLOR = "#C05A6A"
+    GROSOR = 0.55
+
+    @classmethod
+    def agrupar(cls, columnas, opciones=None):
+        opciones = opciones or _opciones_errores(None, series_tiempo.MAX_BARRAS)
+        return series_tiempo.agrupar_por_tiempo(columnas["dia"], columnas[cls.columna],
+                                                opciones["intervalo"], opciones["max_barras"])
+
+    @classmethod
+    def tamano(cls, columnas, opciones=None):
+        return len(cls.agrupar(columnas, opciones)[0])
+
+    @classmethod
+    def spec(cls, columnas, opciones=None):
+        # Las barras se ubican en el ordinal de su intervalo (con "dia", los dias de matplotlib)
+        ordinales, valores, intervalo = cls.agrupar(columnas, opciones)
+        posiciones = ordinales.astype(np.float64)
+        max_y = valores.max()
+
+        # Mismos limites que el autoescalado de antes (5% de margen en x), que contaba tambien
+        # las barras de sombra invisibles corridas casi un ancho a la izquierda
+        inicio, fin = posiciones[0] - cls.GROSOR * 0.95, posiciones[-1] + cls.GROSOR / 2
+        margen = (fin - inicio) * 0.05
+        rango_x = [float(inicio - margen), float(fin + margen)]
+        # Un tick por intervalo del rango, tenga o no errores
+        ticks = [[float(i), series_tiempo.etiqueta(int(i), intervalo)]
+                 for i in np.arange(np.ceil(rango_x[0]), rango_x[1])]
+
+        return cls._spec_base(
+            "vertical",
+            {
+                'x': {'rango': rango_x, 'etiqueta': "Fecha", 'ticks': ticks},
+                'y': {'rango': [0.0, float(max(max_y, 1) * 1.2)], 'etiqueta': "Cantidad de errores", 'ticks': None},
+            },
+            [_serie(posiciones, np.zeros(len(posiciones)), valores, cls.GROSOR,
+                    [cls.BAR_COLOR] * len(posiciones), alfa=0.9)],
+            [{'x': float(x), 'y': float(v + (max_y * 0.03)), 'texto': str(v), 'estilo': "valor"}
+             for x, v in zip(posiciones, valores)],
+            cls.titulo,
+            intervalo=intervalo,
+            inicios=[str(dia) for dia in series_tiempo.inicio(ordinales, intervalo)]
+        )
+
+    def construir(self):
+        ax = self.ax
+        ax.set_facecolor("white")
+
+        self.series = [ax.bar(np.arange(self.n), np.zeros(self.n), color=self.BAR_COLOR, width=self.GROSOR,
+                              linewidth=0, alpha=0.9, zorder=3)]
+        self.anotaciones = [
+            ax.text(0, 0, "", ha='center', va='bottom', fontsize=10, fontweight='medium', color="#333")
+            for _ in range(self.n)
+        ]
+
+        ax.set_xlabel("Fecha", fontsize=10, labelpad=10, color="#555")
+        ax.set_ylabel("Cantidad de errores", fontsize=10, labelpad=10, color="#555")
+        ax.tick_params(axis='x', labelrotation=0, labelsize=9, labelcolor="#444")
+
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.spines['left'].set_color("#BBB")
+        ax.spines['bottom'].set_color("#BBB")
+
+        ax.grid(axis='y', linestyle='--', alpha=0.25, color='#DDD')
+        ax.grid(axis='x', visible=False)
+
+        ax.axhline(0, color='#EEE', linewidth=1.2, zorder=1)
+
+        ax.set_title(self.titulo, fontsize=12, color="#333", pad=12, weight='semibold')
+
+    def ajustar_layout(self):
+        self._tight_layout(0.8)
+
+
+class PlantillaErroresPosturales(PlantillaErrores):
+    tipo = "errores_posturales"
+    columna = "totalErroresPosturales"
+    titulo = "Errores Posturales por Fecha"
 
-            df["dia_dt"] = pd.to_datetime(df["dia"])
-            df = df.sort_values(by='dia_dt')
-
-            BAR_COLOR = "#C05A6A"
-            EDGE_COLOR = "#EAC7C7"
-
-            fig, ax = plt.subplots(figsize=(7, 4), facecolor='white')
-            ax.set_facecolor("white")
-
-            bars = ax.bar(
-                df["dia_dt"],
-                df["totalErroresPosturales"],
-                color=BAR_COLOR,
-                edgecolor=EDGE_COLOR,
-                width=0.55,
-                linewidth=1.2
-            )
-
-            for bar in bars:
-                bar.set_zorder(3)
-                bar.set_linewidth(0)
-                bar.set_alpha(0.9)
-
-            for bar in bars:
-                ax.bar(
-                    bar.get_x() + bar.get_width() * 0.05,
-                    bar.get_height(),
-                    width=bar.get_width(),
-                    color="none",
-                    edgecolor="none",
-                    zorder=2
-                )
-
-            max_y = df["totalErroresPosturales"].max()
-            for i, v in enumerate(df["totalErroresPosturales"]):
-                ax.text(
-                    df["dia_dt"].iloc[i],
-                    v + (max_y * 0.03),
-                    str(v),
-                    ha='center',
-                    va='bottom',
-                    fontsize=10,
-                    fontweight='medium',
-                    color="#333"
-                )
-
-            ax.set_xlabel("Fecha", fontsize=10, labelpad=10, color="#555")
-            ax.set_ylabel("Cantidad de errores", fontsize=10, labelpad=10, color="#555")
-
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b'))
-            ax.xaxis.set_major_locator(mdates.DayLocator(interval=1))
-            plt.setp(ax.get_xticklabels(), rotation=0, ha='center', fontsize=9, color="#444")
-
-            ax.set_ylim(0, max_y * 1.2)
-            ax.spines['right'].set_visible(False)
-            ax.spines['top'].set_visible(False)
-            ax.spines['left'].set_color("#BBB")
-            ax.spines['bottom'].set_color("#BBB")
-
-            ax.grid(axis='y', linestyle='--', alpha=0.25, color='#DDD')
-            ax.grid(axis='x', visible=False)
-
-            ax.axhline(0, color='#EEE', linewidth=1.2, zorder=1)
-
-            ax.set_title("Errores Posturales por Fecha", fontsize=12, color="#333", pad=12, weight='semibold')
-
-            plt.tight_layout(pad=0.8)
-            return _mostrar_y_guardar("errores_posturales", fig)
-
-        except Exception as e:
-            print(f"[PYTHON LOG] ❌ Error en errores_posturales_graph: {e}")
 
 # ==========================================================
 # 🔹 3. Errores Musicales
 # ==========================================================
-def errores_musicales_graph(datos):
-    with _graph_lock:
-        try:
-            print(f"[PYTHON LOG] 🔸 Llamada a errores_musicales_graph")
-            print(f"[PYTHON LOG] Datos recibidos: {datos}")
+def errores_musicales_graph(datos, salida=SALIDA_PNG, destino=None, imagen=None, intervalo=None,
+                            max_barras=series_tiempo.MAX_BARRAS):
+    try:
+        imagen = _leer_opciones_imagen(imagen)
+        print(f"[PYTHON LOG] 🔸 Llamada a errores_musicales_graph")
+        print(f"[PYTHON LOG] Datos recibidos: {datos}")
 
-            datos = _convertir_a_lista_python(datos)
+        columnas = _leer_columnas(datos, CAMPOS_ERRORES_MUSICALES)
 
-            if not datos:
-                print("[PYTHON LOG] ⚠️ Lista vacía recibida en errores_musicales_graph.")
-                return _grafico_sin_datos("errores_musicales")
+        if columnas is None:
+            print("[PYTHON LOG] ⚠️ Lista vacía recibida en errores_musicales_graph.")
+            return _grafico_sin_datos(salida, destino, imagen)
 
-            datos_procesados = [dict(
-                escala=str(item.getEscala()),
-                totalErroresMusicales=int(item.getTotalErroresMusicales()),
-                dia=str(item.getDia())
-            ) for item in datos]
+        return _grafico(PlantillaErroresMusicales, columnas, salida, destino, imagen, _opciones_errores(intervalo, max_barras))
+    except Exception as e:
+        print(f"[PYTHON LOG] ❌ Error en errores_musicales_graph: {e}")
 
-            df = pd.DataFrame(datos_procesados)
-            print(f"[PYTHON LOG] DataFrame creado:\n{df}")
 
-            df["dia_dt"] = pd.to_datetime(df["dia"])
-            df = df.sort_values(by='dia_dt')
+class PlantillaErroresMusicales(PlantillaErrores):
+    tipo = "errores_musicales"
+    columna = "totalErroresMusicales"
+    titulo = "Errores Musicales por Fecha"
 
-            BAR_COLOR = "#C05A6A"
-            EDGE_COLOR = "#EAC7C7"
 
-            fig, ax = plt.subplots(figsize=(7, 4), facecolor='white')
-            ax.set_facecolor("white")
-
-            bars = ax.bar(
-                df["dia_dt"],
-                df["totalErroresMusicales"],
-                color=BAR_COLOR,
-                edgecolor=EDGE_COLOR,
-                width=0.55,
-                linewidth=1.2
-            )
-
-            for bar in bars:
-                bar.set_zorder(3)
-                bar.set_linewidth(0)
-                bar.set_alpha(0.9)
-
-            for bar in bars:
-                ax.bar(
-                    bar.get_x() + bar.get_width() * 0.05,
-                    bar.get_height(),
-                    width=bar.get_width(),
-                    color="none",
-                    edgecolor="none",
-                    zorder=2
-                )
-
-            max_y = df["totalErroresMusicales"].max()
-            for i, v in enumerate(df["totalErroresMusicales"]):
-                ax.text(
-                    df["dia_dt"].iloc[i],
-                    v + (max_y * 0.03),
-                    str(v),
-                    ha='center',
-                    va='bottom',
-                    fontsize=10,
-                    fontweight='medium',
-                    color="#333"
-                )
-
-            ax.set_xlabel("Fecha", fontsize=10, labelpad=10, color="#555")
-            ax.set_ylabel("Cantidad de errores", fontsize=10, labelpad=10, color="#555")
-
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b'))
-            ax.xaxis.set_major_locator(mdates.DayLocator(interval=1))
-            plt.setp(ax.get_xticklabels(), rotation=0, ha='center', fontsize=9, color="#444")
-
-            ax.set_ylim(0, max_y * 1.2)
-            ax.spines['right'].set_visible(False)
-            ax.spines['top'].set_visible(False)
-            ax.spines['left'].set_color("#BBB")
-            ax.spines['bottom'].set_color("#BBB")
-
-            ax.grid(axis='y', linestyle='--', alpha=0.25, color='#DDD')
-            ax.grid(axis='x', visible=False)
-
-            ax.axhline(0, color='#EEE', linewidth=1.2, zorder=1)
-
-            ax.set_title("Errores Musicales por Fecha", fontsize=12, color="#333", pad=12, weight='semibold')
-
-            plt.tight_layout(pad=0.8)
-            return _mostrar_y_guardar("errores_musicales", fig)
-
-        except Exception as e:
-            print(f"[PYTHON LOG] ❌ Error en errores_musicales_graph: {e}")
 # ==========================================================
 # 🔹 4. Posturas (Tiempos)
 # ==========================================================
-def posturas_graph(datos):
-    with _graph_lock:
-        try:
-            print(f"[PYTHON LOG] 🔸 Llamada a posturas_graph")
-            print(f"[PYTHON LOG] Datos recibidos: {datos}")
-
-            COLOR_MALA_POSTURA = '#E9C4CD'
-            COLOR_BUENA_POSTURA = '#8D1E3A'
-
-            datos = _convertir_a_lista_python(datos)
-
-            if not datos:
-                print("[PYTHON LOG] ⚠️ Lista vacía recibida en posturas_graph.")
-                return _grafico_sin_datos("posturas")
-
-            datos_procesados = [dict(
-                escala=str(item.getEscala()),
-                tiempoMalaPosturaMinutos=float(item.getTiempoMalaPosturaSegundos()) / 60.0,
-                tiempoBuenaPosturaMinutos=float(item.getTiempoBuenaPosturaSegundos()) / 60.0
-            ) for item in datos]
-
-            df = pd.DataFrame(datos_procesados)
-            print(f"[PYTHON LOG] DataFrame de tiempos en minutos:\n{df}")
-
-            df = df.iloc[::-1]
-
-            fig, ax = plt.subplots(figsize=(7, 4))
-
-            ax.barh(
-                df["escala"],
-                df["tiempoBuenaPosturaMinutos"],
-                color=COLOR_BUENA_POSTURA,
-                label="Tiempo en buena postura (min)"
-            )
-            ax.barh(
-                df["escala"],
-                df["tiempoMalaPosturaMinutos"],
-                left=df["tiempoBuenaPosturaMinutos"],
-                color=COLOR_MALA_POSTURA,
-                label="Tiempo en mala postura (min)"
-            )
-
-            ax.set_xlabel("Tiempo (min)", fontsize=10)
-            ax.set_ylabel("")
-
-            handles, labels = ax.get_legend_handles_labels()
-            ax.legend(
-                handles[::-1],
-                labels[::-1],
-                loc='upper center',
-                bbox_to_anchor=(0.5, 1.12),
-                ncol=1,
-                frameon=False,
-                fontsize=9
-            )
-
-            ax.spines['right'].set_visible(False)
-            ax.spines['top'].set_visible(False)
-            ax.spines['left'].set_visible(True)
-            ax.spines['bottom'].set_visible(True)
-            ax.grid(False)
-
-            max_len = max(len(str(label)) for label in df["escala"])
-            left_margin = 0.22 + (max_len * 0.005)
-            plt.subplots_adjust(left=min(left_margin, 0.35), right=0.97, top=0.88, bottom=0.15)
-
-            ax.tick_params(axis='y', labelsize=9, pad=8)
-            ax.tick_params(axis='x', labelsize=9)
-
-            print("[PYTHON LOG] ✅ Gráfico generado correctamente (posturas).")
-            return _mostrar_y_guardar("posturas", fig)
-
-        except Exception as e:
-            print(f"[PYTHON LOG] ❌ Error en posturas_graph: {e}")
+def posturas_graph(datos, salida=SALIDA_PNG, destino=None, imagen=None):
+    try:
+        imagen = _leer_opciones_imagen(imagen)
+        print(f"[PYTHON LOG] 🔸 Llamada a posturas_graph")
+        print(f"[PYTHON LOG] Datos recibidos: {datos}")
+
+        columnas = _leer_columnas(datos, CAMPOS_POSTURAS)
+
+        if columnas is None:
+            print("[PYTHON LOG] ⚠️ Lista vacía recibida en posturas_graph.")
+            return _grafico_sin_datos(salida, destino, imagen)
+
+        return _grafico(PlantillaPosturas, columnas, salida, destino, imagen)
+    except Exception as e:
+        print(f"[PYTHON LOG] ❌ Error en posturas_graph: {e}")
+
+
+class PlantillaBarrasApiladas(PlantillaGrafico):
+    # Dos barras horizontales apiladas por escala; la primera escala queda arriba
+    figsize = (7, 4)
+    columnas = ()
+    colores = ()
+    etiquetas = ()
+    ejes = ("", "")
+    divisor = 1.0
+    margen_x = 1.05
+    GROSOR = 0.8
+
+    @classmethod
+    def spec(cls, columnas, opciones=None):
+        primera = columnas[cls.columnas[0]][::-1] / cls.divisor
+        segunda = columnas[cls.columnas[1]][::-1] / cls.divisor
+        n = len(primera)
+        posiciones = np.arange(n)
+        return cls._spec_base(
+            "horizontal",
+            {
+                'x': {'rango': [0.0, float(max((primera + segunda).max(), 1) * cls.margen_x)],
+                      'etiqueta': cls.ejes[0], 'ticks': None},
+                'y': {'rango': _rango_categorias(n, cls.GROSOR), 'etiqueta': cls.ejes[1],
+                      'ticks': [[int(i), str(escala)] for i, escala in zip(posiciones, columnas["escala"][::-1])]},
+            },
+            [
+                _serie(posiciones, np.zeros(n), primera, cls.GROSOR, [cls.colores[0]] * n, cls.etiquetas[0]),
+                _serie(posiciones, primera, segunda, cls.GROSOR, [cls.colores[1]] * n, cls.etiquetas[1]),
+            ]
+        )
+
+    def construir(self):
+        ax = self.ax
+        y = np.arange(self.n)
+        ceros = np.zeros(self.n)
+        self.series = [
+            ax.barh(y, ceros, height=self.GROSOR, color=self.colores[0], label=self.etiquetas[0]),
+            ax.barh(y, ceros, height=self.GROSOR, left=ceros, color=self.colores[1], label=self.etiquetas[1]),
+        ]
+        ax.set_xlabel(self.ejes[0], fontsize=10)
+        ax.set_ylabel(self.ejes[1], fontsize=10)
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.grid(False)
+        self.estilo()
+
+    def estilo(self):
+        pass
+
+
+class PlantillaPosturas(PlantillaBarrasApiladas):
+    tipo = "posturas"
+    columnas = ("tiempoBuenaPosturaSegundos", "tiempoMalaPosturaSegundos")
+    colores = ('#8D1E3A', '#E9C4CD')
+    etiquetas = ("Tiempo en buena postura (min)", "Tiempo en mala postura (min)")
+    ejes = ("Tiempo (min)", "")
+    divisor = 60.0
+
+    def estilo(self):
+        ax = self.ax
+        handles, labels = ax.get_legend_handles_labels()
+        ax.legend(
+            handles[::-1],
+            labels[::-1],
+            loc='upper center',
+            bbox_to_anchor=(0.5, 1.12),
+            ncol=1,
+            frameon=False,
+            fontsize=9
+        )
+        ax.tick_params(axis='y', labelsize=9, pad=8)
+        ax.tick_params(axis='x', labelsize=9)
+
+    def actualizar(self, columnas, opciones=None):
+        spec = super().actualizar(columnas, opciones)
+        # El margen izquierdo depende del nombre de escala mas largo (subplots_adjust es barato)
+        max_len = max(len(texto) for _, texto in spec['ejes']['y']['ticks'])
+        left_margin = 0.22 + (max_len * 0.005)
+        self.fig.subplots_adjust(left=min(left_margin, 0.35), right=0.97, top=0.88, bottom=0.15)
+        return spec
 
 
 # ==========================================================
 # 🔹 5. Notas (Correctas vs Incorrectas)
 # ==========================================================
-def notas_graph(datos):
-    with _graph_lock:
-        try:
-            print(f"[PYTHON LOG] 🔸 Llamada a notas_graph")
-            print(f"[PYTHON LOG] Datos recibidos: {datos}")
-
-            COLOR_NOTAS_CORRECTAS = '#E9C4CD'
-            COLOR_NOTAS_INCORRECTAS = '#8D1E3A'
-
-            datos = _convertir_a_lista_python(datos)
+def notas_graph(datos, salida=SALIDA_PNG, destino=None, imagen=None):
+    try:
+        imagen = _leer_opciones_imagen(imagen)
+        print(f"[PYTHON LOG] 🔸 Llamada a notas_graph")
+        print(f"[PYTHON LOG] Datos recibidos: {datos}")
+
+        columnas = _leer_columnas(datos, CAMPOS_NOTAS)
+
+        if columnas is None:
+            print("[PYTHON LOG] ⚠️ Lista vacía recibida en notas_graph.")
+            return _grafico_sin_datos(salida, destino, imagen)
+
+        return _grafico(PlantillaNotas, columnas, salida, destino, imagen)
+    except Exception as e:
+        print(f"[PYTHON LOG] ❌ Error en notas_graph: {e}")
+
+
+class PlantillaNotas(PlantillaBarrasApiladas):
+    tipo = "notas"
+    figsize = (5.5, 4)
+    columnas = ("notasCorrectas", "notasIncorrectas")
+    colores = ('#E9C4CD', '#8D1E3A')
+    etiquetas = ("Notas correctas", "Notas incorrectas")
+    ejes = ("Cantidad de notas", "Escala")
+    margen_x = 1.1
+
+    def estilo(self):
+        ax = self.ax
+        handles, labels = ax.get_legend_handles_labels()
+        ax.legend(
+            handles,
+            labels,
+            loc='upper center',
+            bbox_to_anchor=(0.5, 1.15),
+            ncol=2,
+            frameon=False,
+            fontsize=9
+        )
+        ax.tick_params(axis='y', labelsize=9)
+        self.fig.subplots_adjust(left=0.27, right=0.97, top=0.9, bottom=0.15)
+
+    def ajustar_layout(self):
+        self._tight_layout(0.3)
 
-            if not datos:
-                print("[PYTHON LOG] ⚠️ Lista vacía recibida en notas_graph.")
-                return _grafico_sin_datos("notas")
 
-            datos_procesados = [dict(
-                escala=str(item.getEscala()),
-                notasCorrectas=int(item.getNotasCorrectas()),
-                notasIncorrectas=int(item.getNotasIncorrectas())
-            ) for item in datos]
-
-            df = pd.DataFrame(datos_procesados)
-            print(f"[PYTHON LOG] DataFrame creado:\n{df}")
-
-            df = df.iloc[::-1]
-
-            fig, ax = plt.subplots(figsize=(5.5, 4))
-
-            ax.barh(
-                df["escala"],
-                df["notasCorrectas"],
-                color=COLOR_NOTAS_CORRECTAS,
-                label="Notas correctas"
-            )
-
-            ax.barh(
-                df["escala"],
-                df["notasIncorrectas"],
-                left=df["notasCorrectas"],
-                color=COLOR_NOTAS_INCORRECTAS,
-                label="Notas incorrectas"
-            )
-
-            ax.set_xlabel("Cantidad de notas", fontsize=10)
-            ax.set_ylabel("Escala", fontsize=10)
-
-            handles, labels = ax.get_legend_handles_labels()
-            ax.legend(
-                handles,
-                labels,
-                loc='upper center',
-                bbox_to_anchor=(0.5, 1.15),
-                ncol=2,
-                frameon=False,
-                fontsize=9
-            )
-            ax.spines['right'].set_visible(False)
-            ax.spines['top'].set_visible(False)
-            ax.grid(False)
-
-            ax.tick_params(axis='y', labelsize=9)
-            plt.subplots_adjust(left=0.27, right=0.97, top=0.9, bottom=0.15)
-            plt.tight_layout(pad=0.3)
-
-            ax.set_xlim(0, (df["notasCorrectas"] + df["notasIncorrectas"]).max() * 1.1)
-
-            return _mostrar_y_guardar("notas", fig)
-
-        except Exception as e:
-            print(f"[PYTHON LOG] ❌ Error en notas_graph: {e}")
\ No newline at end of file
+# ==========================================================
+# 🔹 Render en paralelo
+# ==========================================================
+GRAFICOS = {
+    "top_escalas": top_escalas_graph,
+    "errores_posturales": errores_posturales_graph,
+    "errores_musicales": errores_musicales_graph,
+    "posturas": posturas_graph,
+    "notas": notas_graph,
+}
+
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+
+def _get_render_executor():
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=RENDER_MAX_WORKERS, thread_name_prefix="graficos")
+        return _render_executor
+
+
+def _leer_datasets(datasets):
+    # Todos los datos del panel en un solo payload: JSON {grafico: columnas}, dict o java.util.Map
+    if isinstance(datasets, str):
+        datasets = json.loads(datasets)
+    elif hasattr(datasets, 'keySet'):
+        datasets = {str(nombre): datasets.get(nombre) for nombre in datasets.keySet().toArray()}
+    desconocidos = [nombre for nombre in datasets if nombre not in GRAFICOS]
+    if desconocidos:
+        raise ValueError(f"Graficos desconocidos: {desconocidos}")
+    return datasets
+
+
+_estilo_listo = False
+_estilo_lock = threading.Lock()
+
+
+def _preparar_estilo():
+    # Resuelve una sola vez las fuentes de todos los pesos que usan los graficos antes de
+    # repartir el trabajo entre hilos, en lugar de que cada grafico las busque por su cuenta
+    global _estilo_listo
+    with _estilo_lock:
+        if not _estilo_listo:
+            for peso in ("normal", "medium", "semibold", "bold"):
+                font_manager.findfont(font_manager.FontProperties(weight=peso))
+            _estilo_listo = True
+
+
+def _leer_imagen_por_grafico(imagen):
+    # Las mismas opciones de imagen para todo el panel o {grafico: opciones} (cada ImageView
+    # tiene su tamano)
+    if isinstance(imagen, str):
+        imagen = json.loads(imagen) if imagen.strip() else None
+    elif hasattr(imagen, 'keySet'):
+        imagen = {str(clave): imagen.get(clave) for clave in imagen.keySet().toArray()}
+    if imagen and any(nombre in GRAFICOS for nombre in imagen):
+        return {nombre: _leer_opciones_imagen(imagen.get(nombre)) for nombre in GRAFICOS}
+    opciones = _leer_opciones_imagen(imagen)
+    return {nombre: opciones for nombre in GRAFICOS}
+
+
+def iter_dashboard(datasets, workers=None, salida=SALIDA_PNG, directorio=None, imagen=None):
+    # Generador de (nombre, imagen) en el orden en que terminan los graficos. workers=None usa
+    # el pool compartido, workers=1 los genera uno tras otro en el hilo que llama. Con
+    # `directorio` cada grafico se escribe en <directorio>/<nombre>.<formato> y se entrega la ruta
+    datasets = _leer_datasets(datasets)
+    opciones = _leer_imagen_por_grafico(imagen)
+    _preparar_estilo()
+    if directorio is not None:
+        os.makedirs(str(directorio), exist_ok=True)
+
+    def generar(nombre, datos):
+        destino = None
+        if directorio is not None:
+            extension = EXTENSIONES_IMAGEN[(opciones[nombre] or {}).get("formato", "png")]
+            destino = os.path.join(str(directorio), f"{nombre}.{extension}")
+        return GRAFICOS[nombre](datos, salida, destino, opciones[nombre])
+
+    if workers == 1:
+        for nombre, datos in datasets.items():
+            yield nombre, generar(nombre, datos)
+        return
+
+    executor = _get_render_executor() if workers is None else ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="graficos")
+    try:
+        futuros = {executor.submit(generar, nombre, datos): nombre for nombre, datos in datasets.items()}
+        for futuro in as_completed(futuros):
+            yield futuros[futuro], futuro.result()
+    finally:
+        if workers is not None:
+            executor.shutdown(wait=False)
+
+
+def render_dashboard(datasets, workers=None, callback=None, salida=SALIDA_PNG, directorio=None, imagen=None):
+    # Un solo llamado para todo el panel de progreso. `callback` (funcion de Python u objeto de
+    # Kotlin con onChart(nombre, imagen)) recibe cada grafico apenas esta listo para que la UI
+    # lo muestre sin esperar al resto. Devuelve un dict nombre -> imagen (bytes, base64 o
+    # ruta del archivo) en el orden de entrada.
+    datasets = _leer_datasets(datasets)
+    notificar = getattr(callback, 'onChart', callback)
+    resultados = {}
+    for nombre, resultado in iter_dashboard(datasets, workers, salida, directorio, imagen):
+        resultados[nombre] = resultado
+        if notificar is not None:
+            try:
+                notificar(nombre, resultado)
+            except Exception as e:
+                print(f"[PYTHON LOG] ❌ Error en callback de render_dashboard ({nombre}): {e}")
+    return {nombre: resultados[nombre] for nombre in datasets}
+
+
+def render_semana(anio, semana, semanas=1, **opciones):
+    # Panel completo desde el almacen local de metricas (metricas.py): cada grafico lee su
+    # ventana ya agregada por semana/dia y escala en lugar de reprocesar las filas crudas.
+    # `opciones` son las de render_dashboard (workers, callback, salida, directorio, imagen)
+    return render_dashboard(metricas.almacen().dashboard(anio, semana, semanas), **opciones)
+
+
+def warmup():
+    # Importa matplotlib y genera un grafico descartable para cargar fuentes y backend
+    def figura_descartable():
+        fig, ax = _nueva_figura(figsize=(4, 3))
+        ax.plot([0, 1], [0, 1])
+        fig.savefig(io.BytesIO(), format="png")
+
+    return run_steps([
+        ("import_matplotlib", lambda: figure.Figure),
+        ("fonts", _preparar_estilo),
+        ("throwaway_figure", figura_descartable),
+    ])
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import progress_charts
+
+ESCALAS = ("Do Mayor", "Re Menor", "Mi Mayor", "Fa Mayor", "Sol Mayor", "La Menor", "Si Menor", "Re Mayor")
+
+
+def datos_dashboard(dias=30, escalas=6, seed=0):
+    # Payload columnar de los cinco graficos del panel de progreso, como lo enviaria Kotlin
+    rng = np.random.RandomState(seed)
+    nombres = list(ESCALAS[:escalas])
+    inicio = date(2025, 11, 1)
+    fechas = [(inicio + timedelta(days=i)).isoformat() for i in range(dias)]
+    escala_por_dia = [nombres[i % len(nombres)] for i in range(dias)]
+    return {
+        "top_escalas": {
+            "escala": nombres[:3],
+            "vecesPracticada": rng.randint(1, 40, 3).tolist(),
+        },
+        "errores_posturales": {
+            "escala": escala_por_dia,
+            "totalErroresPosturales": rng.randint(0, 25, dias).tolist(),
+            "dia": fechas,
+        },
+        "errores_musicales": {
+            "escala": escala_por_dia,
+            "totalErroresMusicales": rng.randint(0, 25, dias).tolist(),
+            "dia": fechas,
+        },
+        "posturas": {
+            "escala": nombres,
+            "tiempoMalaPosturaSegundos": rng.uniform(30, 600, len(nombres)).tolist(),
+            "tiempoBuenaPosturaSegundos": rng.uniform(60, 1800, len(nombres)).tolist(),
+        },
+        "notas": {
+            "escala": nombres,
+            "notasCorrectas": rng.randint(20, 200, len(nombres)).tolist(),
+            "notasIncorrectas": rng.randint(0, 60, len(nombres)).tolist(),
+        },
+    }
+
+
+def medir_dashboard(datos, workers, repeat=3, plantillas=True):
+    # Mediana en ms de generar el panel completo; la cache de graficos se desactiva para
+    # medir siempre el render. plantillas=False construye cada figura desde cero
+    anterior = progress_charts.render_cache
+    progress_charts.render_cache = progress_charts.RenderCache(max_bytes=0)
+    progress_charts.configure_plantillas(plantillas)
+    try:
+        duraciones = []
+        for _ in range(max(1, repeat)):
+            inicio = time.perf_counter()
+            resultado = progress_charts.render_dashboard(datos, workers=workers)
+            duraciones.append((time.perf_counter() - inicio) * 1000.0)
+            fallidos = [nombre for nombre, imagen in resultado.items() if not imagen]
+            if fallidos:
+                raise RuntimeError(f"Graficos sin imagen: {fallidos}")
+    finally:
+        progress_charts.render_cache = anterior
+        progress_charts.configure_plantillas(True)
+    return float(np.median(duraciones))
+
+
+def run_benchmark(dias=30, workers=None, repeat=3, seed=0):
+    datos = datos_dashboard(dias, seed=seed)
+    workers = workers or progress_charts.RENDER_MAX_WORKERS
+    # Calentamiento: imports, fuentes y el pool de hilos
+    progress_charts.render_dashboard(datos)
+    sin_plantillas = medir_dashboard(datos, 1, repeat, plantillas=False)
+    secuencial = medir_dashboard(datos, 1, repeat)
+    paralelo = medir_dashboard(datos, workers, repeat)
+    return {
+        'charts': len(datos),
+        'days': dias,
+        'cpu_count': os.cpu_count(),
+        'workers': workers,
+        'no_templates_ms': sin_plantillas,
+        'sequential_ms': secuencial,
+        'parallel_ms': paralelo,
+        'speedup': secuencial / max(paralelo, 1e-6),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia de render_dashboard: secuencial vs hilos")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(json.dumps(run_benchmark(args.days, args.workers, args.repeat, args.seed), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
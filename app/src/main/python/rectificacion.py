@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+
+import calibracion
+from lazy_imports import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Imagen cenital del teclado: 52 teclas blancas de 20 px de ancho
+RECTIFIED_WIDTH = 1040
+RECTIFIED_HEIGHT = 150
+# Desplazamiento maximo (en pixeles del frame) de cualquier esquina antes de recalcular los mapas
+DRIFT_TOLERANCE = 3.0
+
+
+def parse_corners(corners, frame_width=None):
+    # Acepta la respuesta de is_calibrated (JSON o dict), una lista/ArrayList de esquinas o un
+    # arreglo; devuelve el cuadrilatero ordenado (4, 2) o None si no hay cuatro esquinas.
+    # Con `frame_width` se pasa de coordenadas de RESIZE_WIDTH a las del frame de la camara
+    # (el recorte del area del piano conserva el origen).
+    if isinstance(corners, str):
+        corners = json.loads(corners)
+    if isinstance(corners, dict):
+        corners = corners.get('corners')
+    if hasattr(corners, 'toArray'):
+        corners = list(corners.toArray())
+    if corners is None or len(corners) != 4:
+        return None
+    quad = calibracion._order_quad(np.asarray(corners, np.float32).reshape(4, 1, 2))
+    if frame_width is not None:
+        quad = (quad + 0.5) * (frame_width / calibracion.RESIZE_WIDTH) - 0.5
+    return quad
+
+
+def keyboard_homography(quad, width=RECTIFIED_WIDTH, height=RECTIFIED_HEIGHT):
+    # Homografia del frame a la imagen cenital de width x height
+    destination = np.float32([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]])
+    return cv2.getPerspectiveTransform(np.asarray(quad, np.float32), destination)
+
+
+class KeyboardRectifier:
+    # Convierte las esquinas de una calibracion exitosa en una homografia y precalcula las
+    # tablas de remap (en punto fijo con convertMaps) para la imagen cenital del teclado.
+    # Durante la practica cada frame cuesta un solo cv2.remap; los mapas solo se recalculan
+    # cuando alguna esquina se mueve mas de `tolerance` pixeles respecto a la calibracion
+    # con la que se construyeron.
+
+    def __init__(self, width=RECTIFIED_WIDTH, height=RECTIFIED_HEIGHT, tolerance=DRIFT_TOLERANCE):
+        self.width = width
+        self.height = height
+        self.tolerance = tolerance
+        self.rebuilds = 0
+        self.reuses = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self.corners = None
+        self.homography = None
+        self._map1 = None
+        self._map2 = None
+
+    @property
+    def ready(self):
+        return self._map1 is not None
+
+    def update(self, corners, frame_width=None):
+        # Mismas entradas que parse_corners; devuelve True si se recalcularon los mapas
+        quad = parse_corners(corners, frame_width)
+        if quad is None:
+            self.invalidate()
+            return False
+        if self.corners is not None and float(np.abs(quad - self.corners).max()) <= self.tolerance:
+            self.reuses += 1
+            return False
+
+        self._build_maps(quad)
+        self.rebuilds += 1
+        return True
+
+    def _build_maps(self, quad):
+        self.homography = keyboard_homography(quad, self.width, self.height)
+        # remap necesita, para cada pixel de salida, su posicion en el frame: homografia inversa
+        inverse = np.linalg.inv(self.homography)
+        xs, ys = np.meshgrid(np.arange(self.width, dtype=np.float64), np.arange(self.height, dtype=np.float64))
+        w = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+        map_x = ((inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / w).astype(np.float32)
+        map_y = ((inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / w).astype(np.float32)
+        self._map1, self._map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+        self.corners = quad
+
+    def rectify(self, frame, out=None):
+        if not self.ready:
+            raise ValueError("Sin calibracion: llame a update con las esquinas del piano")
+        return cv2.remap(frame, self._map1, self._map2, cv2.INTER_LINEAR, dst=out,
+                         borderMode=cv2.BORDER_CONSTANT)
+
+    def rectify_yuv(self, yuv_buffer, width, height, row_stride, out=None):
+        # Igual que rectify sobre el plano Y del buffer de la camara, sin copiarlo
+        return self.rectify(calibracion._luma_view(yuv_buffer, width, height, row_stride), out)
+
+    def stats(self):
+        return json.dumps({
+            'ready': self.ready,
+            'rebuilds': self.rebuilds,
+            'reuses': self.reuses,
+            'corners': self.corners.tolist() if self.corners is not None else None
+        })
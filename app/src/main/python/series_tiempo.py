@@ -0,0 +1,74 @@
+import numpy as np
+
+# Agrupacion de historiales por intervalos de tiempo, solo con numpy. Cada intervalo se
+# identifica por su ordinal: cuantos dias, semanas (de lunes a domingo), meses, trimestres o
+# anios pasaron desde 1970, asi agrupar es un np.unique sobre enteros.
+INTERVALOS = ("dia", "semana", "mes", "trimestre", "anio")
+MAX_BARRAS = 14
+# 1970-01-01 fue jueves: sumando 3 dias las semanas empiezan en lunes
+_DESFASE_SEMANA = 3
+_MESES = {"mes": 1, "trimestre": 3, "anio": 12}
+
+
+def a_dias(fechas):
+    # Fechas ISO (o datetime64) -> datetime64[D]
+    return np.asarray(fechas).astype("datetime64[D]")
+
+
+def ordinal(dias, intervalo):
+    dias = a_dias(dias)
+    if intervalo == "dia":
+        return dias.astype(np.int64)
+    if intervalo == "semana":
+        return (dias.astype(np.int64) + _DESFASE_SEMANA) // 7
+    if intervalo in _MESES:
+        return dias.astype("datetime64[M]").astype(np.int64) // _MESES[intervalo]
+    raise ValueError(f"Intervalo desconocido: {intervalo}")
+
+
+def inicio(ordinales, intervalo):
+    # Primer dia (datetime64[D]) de cada intervalo
+    ordinales = np.asarray(ordinales, np.int64)
+    if intervalo == "dia":
+        return ordinales.astype("datetime64[D]")
+    if intervalo == "semana":
+        return (ordinales * 7 - _DESFASE_SEMANA).astype("datetime64[D]")
+    if intervalo in _MESES:
+        return (ordinales * _MESES[intervalo]).astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Intervalo desconocido: {intervalo}")
+
+
+def etiqueta(ordinal_intervalo, intervalo):
+    fecha = inicio(ordinal_intervalo, intervalo).item()
+    if intervalo in ("dia", "semana"):
+        return fecha.strftime('%d %b')
+    if intervalo == "mes":
+        return fecha.strftime('%b %Y')
+    if intervalo == "trimestre":
+        return f"T{(fecha.month - 1) // 3 + 1} {fecha.year}"
+    return str(fecha.year)
+
+
+def elegir_intervalo(dias, max_barras=MAX_BARRAS):
+    # El intervalo mas fino con el que todo el rango de fechas entra en max_barras barras
+    dias = a_dias(dias)
+    extremos = np.array([dias.min(), dias.max()])
+    for intervalo in INTERVALOS:
+        primero, ultimo = ordinal(extremos, intervalo)
+        if ultimo - primero + 1 <= max_barras:
+            return intervalo
+    return INTERVALOS[-1]
+
+
+def agrupar_por_tiempo(dias, valores, intervalo=None, max_barras=MAX_BARRAS):
+    # Suma `valores` por intervalo. Devuelve (ordinales, totales, intervalo) en orden
+    # cronologico, solo con los intervalos que tienen filas. intervalo=None lo elige segun
+    # el rango de fechas para no pasar de max_barras.
+    dias = a_dias(dias)
+    valores = np.asarray(valores)
+    if intervalo is None:
+        intervalo = elegir_intervalo(dias, max_barras)
+    ordinales, grupos = np.unique(ordinal(dias, intervalo), return_inverse=True)
+    totales = np.zeros(len(ordinales), valores.dtype)
+    np.add.at(totales, grupos.ravel(), valores)
+    return ordinales, totales, intervalo
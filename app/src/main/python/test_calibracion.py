@@ -0,0 +1,506 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import calibracion_benchmark
+import calibracion_tuner
+
+from calibracion import (
+    CalibrationSession,
+    FrameBufferPool,
+    FrameResultCache,
+    StageTimer,
+    DEFAULT_DETECTION_PARAMS,
+    FORMAT_PACKED,
+    PACKED_RESULT_LENGTH,
+    compare_detection_modes,
+    detection_params_for,
+    disable_profiling,
+    enable_profiling,
+    is_calibrated,
+    is_calibrated_batch,
+    is_calibrated_yuv,
+    is_piano_straight,
+    load_profile,
+    profiling_stats,
+    reset_profile,
+    stage_timer,
+    unpack_result,
+    _detect_corners,
+    _is_plausible_quad,
+    _luma_view,
+    _order_quads,
+    _vote,
+    _resize_frame
+)
+
+FRAME_WIDTH = 1280
+FRAME_HEIGHT = 720
+ROW_STRIDE = 1344
+PIANO_AREA_PERCENTAGE = 0.6
+HEIGHT_TO_WIDTH_RATIO = FRAME_HEIGHT / FRAME_WIDTH
+
+
+# ==========================================================
+# 🔸 Funciones auxiliares para generar frames de prueba
+# ==========================================================
+def frame_piano(quad=((200, 60), (1080, 60), (1080, 300), (200, 300)), dx=0):
+    # Mascara como la que entrega la segmentacion: piano blanco sobre fondo negro
+    frame = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), np.uint8)
+    cv2.fillConvexPoly(frame, np.array(quad, np.int32) + (dx, 0), 255)
+    return frame
+
+
+def frame_a_jpeg(frame):
+    _, jpeg = cv2.imencode(".jpg", cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    return jpeg.tobytes()
+
+
+def frame_a_nv21(frame, row_stride=ROW_STRIDE):
+    height, width = frame.shape
+    buffer = np.zeros(row_stride * height + (width * height) // 2, np.uint8)
+    buffer[:row_stride * height].reshape(height, row_stride)[:, :width] = frame
+    return buffer.tobytes()
+
+
+def esquinas_ordenadas(resultado):
+    return sorted(tuple(c) for c in resultado["corners"])
+
+
+# ==========================================================
+# 🔹 1. Entrada YUV sin copia
+# ==========================================================
+def test_is_calibrated_yuv_matches_jpeg_path():
+    frame = frame_piano()
+    desde_jpeg = json.loads(is_calibrated(frame_a_jpeg(frame), PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))
+    desde_yuv = json.loads(is_calibrated_yuv(frame_a_nv21(frame), FRAME_WIDTH, FRAME_HEIGHT, ROW_STRIDE,
+                                             PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))
+
+    assert desde_yuv["command"] == desde_jpeg["command"] == "calibrado"
+    for (xj, yj), (xy, yy) in zip(esquinas_ordenadas(desde_jpeg), esquinas_ordenadas(desde_yuv)):
+        assert abs(xj - xy) <= 2 and abs(yj - yy) <= 2
+
+
+def test_luma_view_does_not_copy_buffer():
+    buffer = bytearray(frame_a_nv21(frame_piano()))
+    luma = _luma_view(buffer, FRAME_WIDTH, FRAME_HEIGHT, ROW_STRIDE)
+
+    assert luma.shape == (FRAME_HEIGHT, FRAME_WIDTH)
+    assert np.shares_memory(luma, np.frombuffer(buffer, np.uint8))
+
+
+def test_luma_view_rejects_short_buffer():
+    with pytest.raises(ValueError):
+        _luma_view(bytes(FRAME_WIDTH * 10), FRAME_WIDTH, FRAME_HEIGHT, ROW_STRIDE)
+
+
+# ==========================================================
+# 🔹 2. Sesion de calibracion con seguimiento temporal
+# ==========================================================
+def test_calibration_session_tracks_between_detections():
+    session = CalibrationSession(redetect_every=10)
+    resultados = [
+        json.loads(session.process(frame_a_jpeg(frame_piano(dx=dx)), PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))
+        for dx in range(0, 24, 2)
+    ]
+
+    assert session.detections == 2
+    assert session.tracked_frames == 10
+    assert all(r["command"] == "calibrado" for r in resultados)
+    # 22 px de desplazamiento en el frame original son ~10 px a RESIZE_WIDTH
+    x_inicial = min(x for x, _ in resultados[0]["corners"])
+    x_final = min(x for x, _ in resultados[-1]["corners"])
+    assert 8 <= x_final - x_inicial <= 12
+
+
+def test_calibration_session_redetects_when_piano_is_lost():
+    session = CalibrationSession()
+    session.process(frame_a_jpeg(frame_piano()), PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None)
+    vacio = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), np.uint8)
+    resultado = json.loads(session.process(frame_a_jpeg(vacio), PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))
+
+    assert resultado == {"command": "notCalibrated", "corners": None}
+    assert session.detections == 2
+
+
+# ==========================================================
+# 🔹 3. Deteccion piramidal (gruesa a fina)
+# ==========================================================
+@pytest.mark.parametrize("decode_scale", [1, 2, 4])
+def test_pyramid_mode_matches_full_mode(decode_scale):
+    quad = ((180, 80), (1100, 40), (1050, 330), (230, 300))
+    reporte = json.loads(compare_detection_modes(frame_a_jpeg(frame_piano(quad)), PIANO_AREA_PERCENTAGE,
+                                                 HEIGHT_TO_WIDTH_RATIO, None, decode_scale=decode_scale, repeat=1))
+
+    assert reporte["pyramid"]["command"] == reporte["full"]["command"]
+    assert reporte["max_corner_difference"] <= 4
+
+
+@pytest.fixture(scope="module")
+def corpus_girado_y_grande():
+    # Frames girados 9 grados y con el piano mas ancho que el frame
+    corpus = calibracion_benchmark.synthetic_corpus(48, 7)
+    return [sample for sample in corpus
+            if abs(sample["params"]["rotation"]) == 9.0 or sample["params"]["piano_width"] == 1300]
+
+
+def test_pyramid_mode_handles_rotated_and_oversized_pianos(corpus_girado_y_grande):
+    assert len(corpus_girado_y_grande) == 18
+    for sample in corpus_girado_y_grande:
+        reporte = json.loads(compare_detection_modes(sample["jpeg"], sample["piano_area_percentage"],
+                                                     sample["height_to_width_ratio"], None, repeat=1))
+
+        assert reporte["pyramid"]["command"] == sample["command"] == reporte["full"]["command"]
+        if sample["visible"]:
+            assert calibracion_benchmark._corner_error(reporte["pyramid"]["corners"], sample["corners"]) < 4
+
+
+def test_pyramid_benchmark_matches_full_mode_accuracy(corpus_girado_y_grande):
+    full = calibracion_benchmark.run_benchmark(corpus_girado_y_grande, warmup=1, mode="full")
+    pyramid = calibracion_benchmark.run_benchmark(corpus_girado_y_grande, warmup=1, mode="pyramid")
+
+    assert pyramid["command_accuracy"] == full["command_accuracy"] == 1.0
+    assert pyramid["corner_error_mean_px"] <= full["corner_error_mean_px"] + 1
+
+
+def test_implausible_quads_are_rejected():
+    teclado = np.array([[40, 20], [560, 20], [560, 130], [40, 130]], np.float32)
+    esquina_espuria = teclado.copy()
+    esquina_espuria[1] = (152, 100)
+    cuadrado = np.array([[40, 20], [160, 20], [160, 140], [40, 140]], np.float32)
+    aguja = np.array([[40, 20], [560, 20], [100, 60], [40, 130]], np.float32)
+
+    assert _is_plausible_quad(teclado)
+    assert not _is_plausible_quad(esquina_espuria)
+    assert not _is_plausible_quad(cuadrado)
+    assert not _is_plausible_quad(aguja)
+
+
+def test_is_calibrated_rejects_unknown_mode_and_scale():
+    jpeg = frame_a_jpeg(frame_piano())
+    with pytest.raises(ValueError):
+        is_calibrated(jpeg, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, mode="otro")
+    with pytest.raises(ValueError):
+        is_calibrated(jpeg, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, decode_scale=3)
+
+
+# ==========================================================
+# 🔹 4. Pool de buffers por geometria de frame
+# ==========================================================
+def test_frame_buffer_pool_reuses_buffers_until_geometry_changes():
+    pool = FrameBufferPool()
+    for _ in range(3):
+        _detect_corners(_resize_frame(frame_piano(), pool), pool=pool)
+    allocations = pool.allocations
+    retained = pool.retained_bytes()
+
+    _detect_corners(_resize_frame(frame_piano(), pool), pool=pool)
+    assert pool.allocations == allocations
+    assert retained >= 5 * 608 * 256
+
+    recortado = frame_piano()[:400]
+    _detect_corners(_resize_frame(recortado, pool), pool=pool)
+    assert pool.allocations > allocations
+
+
+# ==========================================================
+# 🔹 5. Instrumentacion por etapa
+# ==========================================================
+def test_profiling_reports_percentiles_per_stage():
+    stage_timer.reset()
+    enable_profiling(capacity=8)
+    try:
+        for _ in range(10):
+            is_calibrated(frame_a_jpeg(frame_piano()), PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None)
+    finally:
+        disable_profiling()
+
+    stats = json.loads(profiling_stats())
+    esperadas = ["decode", "crop", "resize", "threshold", "canny", "dilate", "find_contours",
+                 "convex_hull", "draw", "good_features", "geometry"]
+    assert list(stats) == esperadas
+    for etapa in stats.values():
+        assert etapa["count"] == 10
+        assert 0 <= etapa["p50_ms"] <= etapa["p95_ms"] <= etapa["max_ms"]
+
+
+def test_stage_timer_disabled_records_nothing():
+    timer = StageTimer(capacity=4)
+    mark = timer.start()
+    assert timer.lap("threshold", mark) == mark == 0.0
+    assert timer.stats() == {}
+
+    timer.enable()
+    for valor in (1.0, 2.0, 3.0, 4.0, 100.0):
+        timer.record("canny", valor / 1000.0)
+    # El ring buffer solo conserva las ultimas 4 muestras
+    assert timer.stats()["canny"]["count"] == 5
+    assert timer.stats()["canny"]["max_ms"] == pytest.approx(100.0)
+    assert min(timer._samples["canny"]) == pytest.approx(0.002)
+
+
+# ==========================================================
+# 🔹 6. Corpus sintetico y benchmark
+# ==========================================================
+@pytest.fixture(scope="module")
+def corpus_sintetico():
+    return calibracion_benchmark.synthetic_corpus(16)
+
+
+def test_synthetic_corpus_covers_every_command(corpus_sintetico):
+    comandos = {sample["command"] for sample in corpus_sintetico}
+    assert comandos == {"calibrado", "izquierda", "derecha", "r_derecha", "r_izquierda", "adelante", "atras", "arriba"}
+
+
+@pytest.mark.parametrize("mode", ["full", "pyramid"])
+def test_benchmark_reports_speed_and_accuracy(corpus_sintetico, mode):
+    reporte = calibracion_benchmark.run_benchmark(corpus_sintetico, warmup=1, mode=mode)
+
+    assert reporte["frames"] == 16
+    assert reporte["fps"] > 0 and reporte["peak_memory_bytes"] > 0
+    assert reporte["command_accuracy"] >= 0.9
+    assert reporte["corner_error_mean_px"] < 4
+    assert calibracion_benchmark.check_thresholds(reporte, min_accuracy=0.9, max_corner_error=4) == []
+
+
+def test_benchmark_flags_regressions():
+    base = dict(fps=100.0, latency_p95_ms=10.0, command_accuracy=0.95, corner_error_mean_px=2.0)
+    lento = dict(base, fps=60.0, latency_p95_ms=16.0)
+    impreciso = dict(base, command_accuracy=0.7, corner_error_mean_px=6.0)
+
+    assert calibracion_benchmark.check_regression(base, base) == []
+    assert len(calibracion_benchmark.check_regression(lento, base)) == 2
+    assert len(calibracion_benchmark.check_regression(impreciso, base)) == 2
+    assert calibracion_benchmark.check_thresholds(lento, min_fps=80) != []
+
+
+# ==========================================================
+# 🔹 7. Lote de frames con votacion
+# ==========================================================
+def test_is_calibrated_batch_votes_command_and_median_corners():
+    centrado = frame_a_jpeg(frame_piano())
+    girado = frame_a_jpeg(frame_piano(((200, 60), (1080, 20), (1080, 260), (200, 330))))
+    resultado = json.loads(is_calibrated_batch([centrado, girado, centrado, centrado], PIANO_AREA_PERCENTAGE,
+                                               HEIGHT_TO_WIDTH_RATIO, None))
+    individual = json.loads(is_calibrated(centrado, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))
+
+    assert resultado["command"] == "calibrado"
+    assert resultado["confidence"] == pytest.approx(0.75)
+    assert resultado["frames"] == 4
+    assert sorted(map(tuple, resultado["corners"])) == esquinas_ordenadas(individual)
+
+
+def test_vote_breaks_ties_with_most_recent_frame():
+    resultados = [
+        {"command": "izquierda", "corners": [(0, 0), (10, 0), (10, 5), (0, 5)]},
+        {"command": "notCalibrated", "corners": None},
+    ]
+    votado = _vote(resultados)
+    assert votado["command"] == "notCalibrated"
+    assert votado["corners"] is None
+    assert votado["confidence"] == 0.5
+    assert json.loads(is_calibrated_batch([], PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))["frames"] == 0
+
+
+# ==========================================================
+# 🔹 8. Puntaje vectorizado de cuadrilateros
+# ==========================================================
+def test_quad_scoring_ignores_larger_bright_distractor():
+    sample = calibracion_benchmark.render_synthetic_piano(center=(900, 200), piano_width=600,
+                                                          distractor=(20, 20, 420, 380))
+    argumentos = (sample["jpeg"], PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None)
+    mayor_area = json.loads(is_calibrated(*argumentos, selector="largest"))
+    puntuado = json.loads(is_calibrated(*argumentos))
+
+    assert mayor_area["command"] != sample["command"]
+    assert puntuado["command"] == sample["command"] == "calibrado"
+    assert calibracion_benchmark._corner_error(puntuado["corners"], sample["corners"]) < 3
+
+
+def test_order_quads_is_vectorized_and_matches_geometry_checks():
+    quads = np.array([
+        [[10, 50], [10, 10], [90, 10], [90, 50]],
+        [[95, 12], [5, 60], [100, 58], [0, 8]],
+    ], np.float32)
+    ordenados = _order_quads(quads)
+
+    assert ordenados.shape == (2, 4, 2)
+    assert ordenados[0].tolist() == [[10, 10], [90, 10], [90, 50], [10, 50]]
+    assert ordenados[1].tolist() == [[0, 8], [95, 12], [100, 58], [5, 60]]
+    assert is_piano_straight(quads[0])
+    assert not is_piano_straight(np.array([[0, 0], [30, 40], [100, 0], [130, 40]], np.float32))
+
+
+def _is_piano_straight_original(corners):
+    # Regla de la version anterior (anidada en is_calibrated), como referencia
+    def angulo(a, b, c):
+        ba, bc = np.array(a) - np.array(b), np.array(c) - np.array(b)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cos = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
+        return np.degrees(np.arccos(np.clip(cos, -1, 1)))
+
+    p = sorted((tuple(c) for c in corners), key=lambda c: c[0])
+    izquierdo = angulo(p[1], p[0], (p[1][0], p[0][1]))
+    derecho = angulo(p[3], p[2], (p[3][0], p[2][1]))
+    return all(np.isnan(a) or 85 <= a < 90 for a in (izquierdo, derecho))
+
+
+def test_piano_straight_keeps_the_original_rule():
+    def lados(grados, alto=40):
+        dx = alto / np.tan(np.radians(grados))
+        return np.array([[0, 0], [dx, alto], [100, 0], [100 + dx, alto]], np.float32)
+
+    assert is_piano_straight(lados(87))
+    assert not is_piano_straight(lados(84))
+    # Lado vertical o esquinas repetidas: angulo indefinido, cuenta como recto
+    assert is_piano_straight(np.array([[0, 0], [0, 40], [100, 0], [100, 40]], np.float32))
+    assert is_piano_straight(np.array([[0, 0], [0, 0], [100, 0], [103, 40]], np.float32))
+
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        quad = np.array([[0, 0], [0, 40], [100, 0], [100, 40]], np.float32)
+        quad += rng.normal(0, 3, quad.shape).astype(np.float32)
+        assert is_piano_straight(quad) == _is_piano_straight_original(quad)
+
+
+# ==========================================================
+# 🔹 9. Esquinas directas sobre el poligono del cascaron
+# ==========================================================
+def test_polygon_corners_match_ground_truth_without_canvas(corpus_sintetico):
+    pool = FrameBufferPool()
+    for sample in corpus_sintetico[:8]:
+        frame = cv2.imdecode(np.frombuffer(sample["jpeg"], np.uint8), cv2.IMREAD_COLOR)
+        img = _resize_frame(frame[:int(FRAME_HEIGHT * PIANO_AREA_PERCENTAGE)], pool)
+        esquinas = _detect_corners(img, pool=pool, corner_method="polygon")
+
+        assert esquinas.shape == (4, 1, 2)
+        if sample["visible"]:
+            assert calibracion_benchmark._corner_error(esquinas, sample["corners"]) < 3
+    # El metodo poligonal no rasteriza el cascaron
+    assert "drawing" not in pool._buffers
+
+
+def test_compare_corner_methods_reports_latency_delta(corpus_sintetico):
+    reporte = calibracion_benchmark.compare_corner_methods(corpus_sintetico[:8], warmup=1)
+
+    assert set(reporte) == {"shi_tomasi", "polygon", "latency_p50_delta_ms", "latency_p95_delta_ms"}
+    assert reporte["polygon"]["command_accuracy"] >= reporte["shi_tomasi"]["command_accuracy"] - 0.15
+    with pytest.raises(ValueError):
+        is_calibrated(corpus_sintetico[0]["jpeg"], PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None,
+                      corner_method="harris")
+
+
+# ==========================================================
+# 🔹 10. Cache de resultados por similitud de frame
+# ==========================================================
+def test_frame_cache_reuses_result_for_near_identical_frames():
+    cache = FrameResultCache()
+    jpeg = frame_a_jpeg(frame_piano())
+    casi_igual = frame_a_jpeg(frame_piano(dx=1))
+    movido = frame_a_jpeg(frame_piano(dx=120))
+
+    primero = is_calibrated(jpeg, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, cache=cache)
+    segundo = is_calibrated(casi_igual, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, cache=cache)
+    assert segundo == primero
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    tercero = is_calibrated(movido, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, cache=cache)
+    assert tercero == is_calibrated(movido, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None)
+    assert cache.stats()["misses"] == 2
+
+
+def test_frame_cache_expires_and_separates_options():
+    reloj = [0.0]
+    cache = FrameResultCache(max_age=1.0, clock=lambda: reloj[0])
+    huella = cache.fingerprint(frame_piano())
+    cache.store(huella, {"command": "calibrado"}, key="full")
+
+    assert cache.lookup(huella, key="full") == {"command": "calibrado"}
+    assert cache.lookup(huella, key="pyramid") is None
+    reloj[0] = 1.5
+    assert cache.lookup(huella, key="full") is None
+    assert cache.expired == 1
+
+
+def test_session_with_cache_skips_tracking_on_static_frames():
+    sesion = CalibrationSession(cache=FrameResultCache())
+    jpeg = frame_a_jpeg(frame_piano())
+    resultados = [sesion.process(jpeg, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None) for _ in range(5)]
+
+    assert len(set(resultados)) == 1
+    assert sesion.detections == 1 and sesion.tracked_frames == 0
+    assert sesion.cache.hits == 4
+
+
+# ==========================================================
+# 🔹 11. Perfiles de parametros y ajuste offline
+# ==========================================================
+@pytest.fixture
+def perfil_restaurado():
+    yield
+    reset_profile()
+
+
+def test_load_profile_selects_params_by_brightness(perfil_restaurado):
+    oscuro = dict(DEFAULT_DETECTION_PARAMS, threshold=120)
+    load_profile({
+        "default": {"canny_high": 300},
+        "lighting": [{"name": "dark", "max_brightness": 90, "params": oscuro}]
+    })
+
+    assert detection_params_for(np.full((100, 300), 40, np.uint8))["threshold"] == 120
+    claro = detection_params_for(np.full((100, 300), 200, np.uint8))
+    assert claro["threshold"] == 176 and claro["canny_high"] == 300
+
+    with pytest.raises(ValueError):
+        load_profile({"default": {"umbral": 10}})
+
+
+def test_tuner_sweeps_in_parallel_and_writes_loadable_profile(tmp_path, corpus_sintetico, perfil_restaurado):
+    muestras = calibracion_tuner.load_labelled_frames(
+        calibracion_tuner.export_corpus(corpus_sintetico[:8], str(tmp_path / "frames"))
+    )
+    grilla = {"threshold": (176, 250), "dilation_kernel": (3,)}
+    perfil = calibracion_tuner.tune(muestras, grid=grilla, workers=2, min_bucket_frames=4)
+
+    ranking = perfil["report"]["all"]
+    assert len(ranking) == 2
+    assert ranking[0]["accuracy"] >= ranking[1]["accuracy"]
+    assert perfil["default"]["threshold"] == 176
+
+    ruta = tmp_path / "perfil.json"
+    ruta.write_text(json.dumps(perfil))
+    cargado = json.loads(load_profile(str(ruta)))
+    assert cargado["default"]["threshold"] == 176
+
+
+# ==========================================================
+# 🔹 12. Resultado empaquetado en int32
+# ==========================================================
+def test_packed_result_matches_json_and_reuses_buffer():
+    jpeg = frame_a_jpeg(frame_piano())
+    como_json = json.loads(is_calibrated(jpeg, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None))
+    salida = bytearray(4 * PACKED_RESULT_LENGTH)
+    devuelto = is_calibrated(jpeg, PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, output=FORMAT_PACKED, out=salida)
+
+    assert devuelto is salida
+    empaquetado = unpack_result(salida)
+    assert empaquetado["command"] == como_json["command"] == "calibrado"
+    assert empaquetado["corners"] == [tuple(c) for c in como_json["corners"]]
+    assert empaquetado["confidence"] == 1.0
+
+    vacio = np.zeros((FRAME_HEIGHT, FRAME_WIDTH), np.uint8)
+    is_calibrated(frame_a_jpeg(vacio), PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None, output=FORMAT_PACKED, out=salida)
+    assert unpack_result(salida) == {"command": "notCalibrated", "corners": None, "confidence": 0.0}
+
+
+def test_packed_batch_carries_vote_confidence():
+    jpeg = frame_a_jpeg(frame_piano())
+    vacio = frame_a_jpeg(np.zeros((FRAME_HEIGHT, FRAME_WIDTH), np.uint8))
+    empaquetado = is_calibrated_batch([jpeg, jpeg, vacio, jpeg], PIANO_AREA_PERCENTAGE, HEIGHT_TO_WIDTH_RATIO, None,
+                                      output=FORMAT_PACKED)
+
+    assert empaquetado.dtype == np.int32 and empaquetado.shape == (PACKED_RESULT_LENGTH,)
+    assert unpack_result(empaquetado)["confidence"] == 0.75
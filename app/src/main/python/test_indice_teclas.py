@@ -0,0 +1,74 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import calibracion_benchmark
+from calibracion import is_calibrated
+from indice_teclas import NO_KEY, KeyIndex, note_name
+
+
+# ==========================================================
+# 🔹 1. Teclas blancas y negras del teclado completo
+# ==========================================================
+def test_full_keyboard_has_88_keys_with_names():
+    indice = KeyIndex()
+    teclas = indice.keys()
+
+    assert len(teclas) == 88
+    assert sum(t["black"] for t in teclas) == 36
+    assert (teclas[0]["midi"], teclas[0]["name"]) == (21, "La0")
+    assert (teclas[-1]["midi"], teclas[-1]["name"]) == (108, "Do8")
+    assert note_name(60) == "Do4" and note_name(61) == "Do#4"
+
+
+def test_lookup_is_vectorized_and_prioritizes_black_keys():
+    indice = KeyIndex()
+    ancho_blanca = indice.width / indice.white_keys
+    # Centro de Do4 (blanca 23), borde Do4/Re4 arriba (Do#4) y abajo (Do4/Re4), fuera del teclado
+    puntos = [
+        (23.3 * ancho_blanca, 130),
+        (24 * ancho_blanca, 20),
+        (24 * ancho_blanca - 2, 140),
+        (24 * ancho_blanca + 2, 140),
+        (-5, 20),
+        (100, indice.height + 1),
+    ]
+    assert indice.lookup(puntos).tolist() == [60, 61, 60, 62, NO_KEY, NO_KEY]
+    # Entre Mi y Fa no hay tecla negra
+    assert indice.key_at(26 * ancho_blanca, 10)["name"] == "Fa4"
+
+
+def test_partial_keyboard_must_start_on_white_key():
+    indice = KeyIndex(first_midi=48, white_keys=14)
+    assert indice.keys()[0]["name"] == "Do3" and indice.keys()[-1]["name"] == "Si4"
+    with pytest.raises(ValueError):
+        KeyIndex(first_midi=49)
+
+
+# ==========================================================
+# 🔹 2. Desde la calibracion y serializacion
+# ==========================================================
+def test_frame_points_map_through_calibration_homography():
+    muestra = calibracion_benchmark.render_synthetic_piano(center=(640, 190), rotation=3.0, perspective=0.05)
+    respuesta = is_calibrated(muestra["jpeg"], muestra["piano_area_percentage"], muestra["height_to_width_ratio"], None)
+    indice = KeyIndex.from_calibration(respuesta, frame_width=calibracion_benchmark.FRAME_WIDTH)
+
+    # Centro inferior de cada tecla blanca, llevado al frame con la homografia inversa
+    centros = np.column_stack([(indice.white_edges[:-1] + indice.white_edges[1:]) / 2, np.full(52, 135.0)])
+    en_frame = cv2.perspectiveTransform(centros.reshape(-1, 1, 2), np.linalg.inv(indice.homography))
+    assert np.array_equal(indice.lookup_frame(en_frame), indice.white_midis)
+
+    blob = en_frame[10, 0] + np.random.RandomState(0).uniform(-2, 2, (30, 2))
+    assert indice.key_for_blob(blob, frame=True)["midi"] == indice.white_midis[10]
+
+
+def test_index_round_trips_through_json():
+    indice = KeyIndex.from_calibration([[100, 40], [500, 40], [500, 120], [100, 120]])
+    copia = KeyIndex.from_json(indice.to_json())
+    puntos = np.random.RandomState(1).uniform([0, 0], [indice.width, indice.height], (200, 2))
+
+    assert np.array_equal(copia.lookup(puntos), indice.lookup(puntos))
+    assert np.allclose(copia.homography, indice.homography)
+    assert len(json.loads(indice.to_json())["keys"]) == 88
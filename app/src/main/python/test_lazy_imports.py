@@ -0,0 +1,47 @@
+import json
+import sys
+
+import lazy_imports
+from lazy_imports import LazyModule, lazy_import, run_steps
+
+
+# ==========================================================
+# 🔹 1. Import diferido
+# ==========================================================
+def test_lazy_module_imports_on_first_attribute_access(tmp_path, monkeypatch):
+    (tmp_path / "modulo_pesado.py").write_text("VALOR = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "modulo_pesado", raising=False)
+
+    modulo = LazyModule("modulo_pesado")
+    assert not modulo.loaded and "modulo_pesado" not in sys.modules
+
+    assert modulo.VALOR == 42
+    assert modulo.loaded
+    assert "modulo_pesado" in lazy_imports.import_timings()
+
+
+def test_lazy_import_shares_one_proxy_per_name():
+    assert lazy_import("json") is lazy_import("json")
+    assert lazy_import("json").dumps({}) == "{}"
+
+
+# ==========================================================
+# 🔹 2. Precalentamiento
+# ==========================================================
+def test_run_steps_records_errors_without_stopping():
+    def falla():
+        raise RuntimeError("sin camara")
+
+    tiempos = run_steps([("falla", falla), ("ok", lambda: None)])
+    assert tiempos["falla"]["error"] == "sin camara"
+    assert isinstance(tiempos["ok"], float)
+
+
+def test_warmup_reports_each_module_step():
+    reporte = lazy_imports.warmup(("calibracion", "escalas", "modulo_que_no_existe"))
+
+    assert set(reporte["calibracion"]) == {"import", "import_cv2", "dummy_frame"}
+    assert all(isinstance(ms, float) for ms in reporte["escalas"].values())
+    assert "error" in reporte["modulo_que_no_existe"]["import"]
+    json.dumps(reporte)
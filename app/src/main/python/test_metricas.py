@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+import metricas
+import progress_charts
+from metricas import MetricasPractica, semana_iso
+
+
+def resultado(dia, escala, **valores):
+    base = {"dia": dia, "escala": escala, "erroresPosturales": 0, "erroresMusicales": 0,
+            "tiempoBuenaPosturaSegundos": 0, "tiempoMalaPosturaSegundos": 0,
+            "notasCorrectas": 0, "notasIncorrectas": 0}
+    base.update(valores)
+    return base
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    store = MetricasPractica(str(tmp_path / "metricas.db"))
+    # Semana ISO 45 de 2025: lunes 3 a domingo 9 de noviembre
+    store.registrar([
+        resultado("2025-11-03", "Do Mayor", id="a", erroresPosturales=2, notasCorrectas=30, notasIncorrectas=5,
+                  tiempoBuenaPosturaSegundos=300, tiempoMalaPosturaSegundos=60),
+        resultado("2025-11-03", "Do Mayor", id="b", erroresPosturales=1, erroresMusicales=4, notasCorrectas=20),
+        resultado("2025-11-05", "Re Menor", id="c", erroresMusicales=3, notasCorrectas=10, notasIncorrectas=10),
+        resultado("2025-11-09T21:30:00", "Mi Mayor", id="d", tiempoBuenaPosturaSegundos=120),
+        resultado("2025-11-10", "Re Menor", id="e", erroresPosturales=7),
+    ])
+    yield store
+    store.cerrar()
+
+
+# ==========================================================
+# 🔹 1. Acumulados incrementales por semana y escala
+# ==========================================================
+def test_weekly_rollups_match_raw_results(almacen):
+    assert almacen.top_escalas(2025, 45) == {"escala": ["Do Mayor", "Mi Mayor", "Re Menor"],
+                                             "vecesPracticada": [2, 1, 1]}
+    assert almacen.notas(2025, 45) == {"escala": ["Do Mayor", "Re Menor"], "notasCorrectas": [50, 10],
+                                       "notasIncorrectas": [5, 10]}
+    assert almacen.posturas(2025, 45)["escala"] == ["Do Mayor", "Mi Mayor"]
+    assert almacen.errores("errores_posturales", 2025, 45) == {
+        "escala": ["Do Mayor"], "totalErroresPosturales": [3], "dia": ["2025-11-03"]}
+    assert almacen.errores("errores_posturales", 2025, 46, semanas=2)["totalErroresPosturales"] == [3, 7]
+    assert semana_iso(2025, 46) == semana_iso(2025, 45) + 1
+
+
+def test_registering_same_result_twice_counts_once(almacen):
+    reporte = almacen.registrar(json.dumps([resultado("2025-11-04", "Do Mayor", id="a", notasCorrectas=99),
+                                            resultado("2025-11-04", "Do Mayor", id="f", notasCorrectas=1)]))
+    assert reporte == {"added": 1, "duplicates": 1}
+    assert almacen.notas(2025, 45)["notasCorrectas"] == [51, 10]
+
+    with pytest.raises(ValueError):
+        almacen.registrar({"escala": "Do Mayor"})
+
+
+def test_rebuild_and_reopen_keep_the_same_rollups(almacen):
+    antes = almacen.dashboard(2025, 46, semanas=2)
+    almacen.reconstruir()
+    assert almacen.dashboard(2025, 46, semanas=2) == antes
+
+    almacen.cerrar()
+    reabierto = MetricasPractica(almacen.ruta)
+    assert reabierto.dashboard(2025, 46, semanas=2) == antes
+    assert reabierto.stats() == {"resultados": 5, "semanal": 4, "diario": 4}
+    reabierto.cerrar()
+
+
+# ==========================================================
+# 🔹 2. Panel de progreso desde el almacen
+# ==========================================================
+def test_render_semana_reads_configured_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(progress_charts, "render_cache", progress_charts.RenderCache(max_bytes=0))
+    monkeypatch.setattr(metricas, "_almacen", None)
+    with pytest.raises(ValueError):
+        metricas.almacen()
+
+    metricas.configure_metricas(str(tmp_path / "app" / "metricas.db"))
+    reporte = json.loads(metricas.registrar_resultados(
+        [resultado("2025-11-03", "Do Mayor", erroresPosturales=2, notasCorrectas=8, tiempoBuenaPosturaSegundos=90)]))
+    assert reporte["added"] == 1
+
+    specs = progress_charts.render_semana(2025, 45, salida="spec", workers=1)
+    assert json.loads(specs["notas"])["series"][0]["valores"] == [8]
+    assert json.loads(specs["errores_musicales"])["tipo"] == "sin_datos"
+    assert json.loads(metricas.dashboard_semana(2025, 45))["top_escalas"]["vecesPracticada"] == [1]
+    metricas.almacen().cerrar()
@@ -1,12 +1,31 @@
 import pytest
+import array
 import base64
+import io
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import progress_charts
+import progress_charts_benchmark
 
 from progress_charts import (
     top_escalas_graph,
     errores_posturales_graph,
     errores_musicales_graph,
     posturas_graph,
-    notas_graph
+    notas_graph,
+    CAMPOS_ERRORES_POSTURALES,
+    CAMPOS_POSTURAS,
+    RenderCache,
+    iter_dashboard,
+    render_dashboard,
+    _leer_columnas
 )
 
 # 🔹 Clase mock para simular objetos Java con getters
@@ -23,10 +42,14 @@ class MockItem:
 # ==========================================================
 # 🔸 Función auxiliar para validar resultado gráfico
 # ==========================================================
+def validar_png(resultado):
+    assert isinstance(resultado, bytes)
+    assert resultado.startswith(b"\x89PNG")  # PNG signature
+
+
 def validar_imagen_base64(resultado):
     assert isinstance(resultado, str)
-    decoded = base64.b64decode(resultado)
-    assert decoded.startswith(b"\x89PNG")  # PNG signature
+    validar_png(base64.b64decode(resultado))
 
 
 # ==========================================================
@@ -39,12 +62,12 @@ def test_top_escalas_graph_generates_image():
         MockItem(Escala="Mi Mayor", VecesPracticada=4),
     ]
     result = top_escalas_graph(datos)
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 def test_top_escalas_graph_empty_data():
     result = top_escalas_graph([])
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 # ==========================================================
@@ -56,12 +79,12 @@ def test_errores_posturales_graph_generates_image():
         MockItem(Escala="Re Menor", TotalErroresPosturales=3, Dia="2025-11-02"),
     ]
     result = errores_posturales_graph(datos)
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 def test_errores_posturales_graph_empty_data():
     result = errores_posturales_graph([])
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 # ==========================================================
@@ -73,12 +96,12 @@ def test_errores_musicales_graph_generates_image():
         MockItem(Escala="Re Menor", TotalErroresMusicales=6, Dia="2025-11-02"),
     ]
     result = errores_musicales_graph(datos)
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 def test_errores_musicales_graph_empty_data():
     result = errores_musicales_graph([])
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 # ==========================================================
@@ -90,12 +113,12 @@ def test_posturas_graph_generates_image():
         MockItem(Escala="Re Menor", TiempoMalaPosturaSegundos=90, TiempoBuenaPosturaSegundos=180),
     ]
     result = posturas_graph(datos)
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 def test_posturas_graph_empty_data():
     result = posturas_graph([])
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 # ==========================================================
@@ -107,9 +130,483 @@ def test_notas_graph_generates_image():
         MockItem(Escala="Re Menor", NotasCorrectas=60, NotasIncorrectas=10),
     ]
     result = notas_graph(datos)
-    validar_imagen_base64(result)
+    validar_png(result)
 
 
 def test_notas_graph_empty_data():
     result = notas_graph([])
-    validar_imagen_base64(result)
+    validar_png(result)
+
+
+# ==========================================================
+# 🔹 6. Payload columnar
+# ==========================================================
+def test_columnar_payload_matches_object_path():
+    objetos = [
+        MockItem(Escala="Do Mayor", TotalErroresPosturales=5, Dia="2025-11-01"),
+        MockItem(Escala="Re Menor", TotalErroresPosturales=3, Dia="2025-11-02"),
+    ]
+    columnar = {
+        "escala": "Do Mayor\nRe Menor",
+        "totalErroresPosturales": np.array([5, 3], np.int32).tobytes(),
+        "dia": ["2025-11-01", "2025-11-02"],
+    }
+    desde_objetos = _leer_columnas(objetos, CAMPOS_ERRORES_POSTURALES)
+    desde_columnas = _leer_columnas(columnar, CAMPOS_ERRORES_POSTURALES)
+
+    for nombre in CAMPOS_ERRORES_POSTURALES:
+        assert desde_columnas[nombre].tolist() == desde_objetos[nombre].tolist()
+
+
+def test_columnar_payload_accepts_kotlin_byte_arrays():
+    # Un ByteArray de Kotlin llega como jarray de Chaquopy: buffer de bytes con signo
+    columnas = _leer_columnas({
+        "escala": "Do Mayor\nRe Menor",
+        "totalErroresPosturales": array.array("b", np.array([5, 300], "<i4").tobytes()),
+        "dia": ["2025-11-01", "2025-11-02"],
+    }, CAMPOS_ERRORES_POSTURALES)
+    assert columnas["totalErroresPosturales"].tolist() == [5, 300]
+
+    columnas = _leer_columnas({
+        "escala": ["Do Mayor"],
+        "tiempoMalaPosturaSegundos": array.array("b", np.array([1.5], "<f8").tobytes()),
+        "tiempoBuenaPosturaSegundos": array.array("i", [2]),
+    }, CAMPOS_POSTURAS)
+    assert columnas["tiempoMalaPosturaSegundos"].tolist() == [1.5]
+    assert columnas["tiempoBuenaPosturaSegundos"].tolist() == [2.0]
+
+
+def test_chart_functions_accept_json_columns():
+    payload = json.dumps({
+        "escala": ["Do Mayor", "Re Menor"],
+        "tiempoMalaPosturaSegundos": [120, 90],
+        "tiempoBuenaPosturaSegundos": [300, 180],
+    })
+    validar_png(posturas_graph(payload))
+    validar_png(top_escalas_graph({"escala": [], "vecesPracticada": []}))
+
+    columnas = _leer_columnas({
+        "escala": ["Do Mayor"],
+        "tiempoMalaPosturaSegundos": np.array([1.5], "<f8").tobytes(),
+        "tiempoBuenaPosturaSegundos": [2],
+    }, CAMPOS_POSTURAS)
+    assert columnas["tiempoMalaPosturaSegundos"].dtype == np.float64
+
+
+def test_columnar_payload_with_mismatched_columns_is_rejected():
+    with pytest.raises(ValueError):
+        _leer_columnas({"escala": ["Do Mayor"], "totalErroresPosturales": [1, 2], "dia": ["2025-11-01"]},
+                       CAMPOS_ERRORES_POSTURALES)
+    assert notas_graph({"escala": ["Do Mayor"]}) is None
+
+
+# ==========================================================
+# 🔹 7. Cache de graficos
+# ==========================================================
+@pytest.fixture
+def cache_nueva(monkeypatch, tmp_path):
+    cache = RenderCache(directorio=str(tmp_path / "graficos"))
+    monkeypatch.setattr(progress_charts, "render_cache", cache)
+    return cache
+
+
+def test_repeated_chart_is_served_from_cache(cache_nueva):
+    payload = {"escala": ["Do Mayor", "Re Menor"], "notasCorrectas": [80, 60], "notasIncorrectas": [20, 10]}
+    primero = notas_graph(payload)
+    segundo = notas_graph(json.dumps(payload))
+
+    assert segundo == primero
+    assert (cache_nueva.hits, cache_nueva.misses) == (1, 1)
+
+    notas_graph(dict(payload, notasCorrectas=[81, 60]))
+    assert cache_nueva.misses == 2
+
+
+def test_disk_tier_survives_new_cache_instance(cache_nueva, monkeypatch):
+    datos = [MockItem(Escala="Do Mayor", VecesPracticada=3)]
+    imagen = top_escalas_graph(datos)
+
+    nueva = RenderCache(directorio=cache_nueva.directorio)
+    monkeypatch.setattr(progress_charts, "render_cache", nueva)
+    assert top_escalas_graph(datos) == imagen
+    assert nueva.stats()["disk_hits"] == 1 and nueva.misses == 0
+
+
+def test_memory_budget_evicts_least_recently_used():
+    cache = RenderCache(max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.get("a")
+    cache.put("c", "12345")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345" and cache.get("c") == "12345"
+    assert cache.evictions == 1
+    assert RenderCache.clave("notas", {"x": np.array([1])}) != RenderCache.clave("notas", {"x": np.array([2])})
+
+
+def test_disk_evictions_are_counted_once_under_concurrent_puts(tmp_path):
+    cache = RenderCache(max_bytes=0, directorio=str(tmp_path), max_bytes_disco=64)
+    claves = [f"clave{i}" for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda clave: cache.put(clave, b"x" * 16), claves))
+
+    restantes = [nombre for nombre in os.listdir(tmp_path) if nombre.endswith(".bin")]
+    assert cache.stats()["evictions"] == len(claves) - len(restantes)
+
+
+# ==========================================================
+# 🔹 8. Render en paralelo sin pyplot
+# ==========================================================
+@pytest.fixture
+def sin_cache(monkeypatch):
+    monkeypatch.setattr(progress_charts, "render_cache", RenderCache(max_bytes=0))
+
+
+def test_parallel_render_matches_sequential(sin_cache):
+    datos = progress_charts_benchmark.datos_dashboard(dias=10)
+    secuencial = render_dashboard(datos, workers=1)
+    paralelo = render_dashboard(datos, workers=5)
+
+    assert set(paralelo) == set(progress_charts.GRAFICOS)
+    for nombre, imagen in paralelo.items():
+        validar_png(imagen)
+        assert imagen == secuencial[nombre]
+
+
+def test_render_dashboard_rejects_unknown_chart():
+    with pytest.raises(ValueError):
+        render_dashboard({"calorias": []})
+
+
+def test_dashboard_benchmark_reports_both_latencies(sin_cache):
+    reporte = progress_charts_benchmark.run_benchmark(dias=5, workers=2, repeat=1)
+    assert reporte["sequential_ms"] > 0 and reporte["parallel_ms"] > 0
+    assert reporte["charts"] == 5
+
+
+# ==========================================================
+# 🔹 9. Panel completo en un solo llamado
+# ==========================================================
+def test_render_dashboard_streams_each_chart_to_callback(sin_cache):
+    datos = progress_charts_benchmark.datos_dashboard(dias=7)
+    recibidos = []
+    resultado = render_dashboard(json.dumps(datos), callback=lambda nombre, imagen: recibidos.append(nombre))
+
+    assert list(resultado) == list(datos)
+    assert sorted(recibidos) == sorted(datos)
+    for imagen in resultado.values():
+        validar_png(imagen)
+
+
+def test_dashboard_accepts_kotlin_style_listener_and_iterator(sin_cache):
+    class Listener:
+        def __init__(self):
+            self.graficos = {}
+
+        def onChart(self, nombre, imagen):
+            self.graficos[nombre] = imagen
+
+    datos = {"notas": {"escala": ["Do Mayor"], "notasCorrectas": [5], "notasIncorrectas": [1]},
+             "top_escalas": [MockItem(Escala="Do Mayor", VecesPracticada=3)]}
+    listener = Listener()
+    resultado = render_dashboard(datos, workers=1, callback=listener)
+    assert listener.graficos == resultado
+
+    assert dict(iter_dashboard(datos, workers=2)) == resultado
+
+
+# ==========================================================
+# 🔹 10. Salida en bytes, archivo o base64
+# ==========================================================
+NOTAS = {"escala": ["Do Mayor", "Re Menor"], "notasCorrectas": [80, 60], "notasIncorrectas": [20, 10]}
+
+
+def test_chart_writes_png_file_and_returns_path(sin_cache, tmp_path):
+    ruta = tmp_path / "notas.png"
+    resultado = notas_graph(NOTAS, destino=str(ruta))
+
+    assert resultado == str(ruta)
+    validar_png(ruta.read_bytes())
+    assert ruta.read_bytes() == notas_graph(NOTAS)
+
+
+def test_chart_fills_caller_buffer():
+    png = notas_graph(NOTAS)
+    buffer = bytearray(len(png) + 16)
+    assert notas_graph(NOTAS, destino=memoryview(buffer)) == len(png)
+    assert bytes(buffer[:len(png)]) == png
+
+    # Como cualquier error del grafico: se registra en el log y se devuelve None
+    assert notas_graph(NOTAS, destino=bytearray(8)) is None
+
+
+def test_base64_output_is_opt_in():
+    png = posturas_graph({"escala": ["Do Mayor"], "tiempoMalaPosturaSegundos": [60],
+                          "tiempoBuenaPosturaSegundos": [240]})
+    texto = posturas_graph({"escala": ["Do Mayor"], "tiempoMalaPosturaSegundos": [60],
+                            "tiempoBuenaPosturaSegundos": [240]}, salida="base64")
+    validar_imagen_base64(texto)
+    assert base64.b64decode(texto) == png
+
+
+def test_render_dashboard_writes_each_chart_to_directory(sin_cache, tmp_path):
+    datos = progress_charts_benchmark.datos_dashboard(dias=5)
+    rutas = render_dashboard(datos, workers=2, directorio=str(tmp_path / "panel"))
+
+    assert list(rutas) == list(datos)
+    for nombre, ruta in rutas.items():
+        assert ruta.endswith(f"{nombre}.png")
+        with open(ruta, "rb") as archivo:
+            validar_png(archivo.read())
+
+
+# ==========================================================
+# 🔹 11. Plantillas de figuras
+# ==========================================================
+@pytest.fixture
+def plantillas_nuevas(sin_cache):
+    progress_charts.configure_plantillas(True)
+    yield
+    progress_charts.configure_plantillas(True)
+
+
+def test_template_is_reused_for_same_bar_count(plantillas_nuevas):
+    notas_graph(NOTAS)
+    notas_graph(dict(NOTAS, notasCorrectas=[10, 90]))
+    notas_graph({"escala": ["Do Mayor"], "notasCorrectas": [5], "notasIncorrectas": [1]})
+
+    estado = json.loads(progress_charts.plantillas_stats())
+    assert (estado["created"], estado["reused"], estado["entries"]) == (2, 1, 2)
+
+
+def test_template_render_matches_fresh_figure(plantillas_nuevas):
+    datos = progress_charts_benchmark.datos_dashboard(dias=6)
+    con_plantilla = {nombre: progress_charts.GRAFICOS[nombre](valor) for nombre, valor in datos.items()}
+
+    progress_charts.configure_plantillas(False)
+    for nombre, valor in datos.items():
+        assert progress_charts.GRAFICOS[nombre](valor) == con_plantilla[nombre]
+    assert json.loads(progress_charts.plantillas_stats())["entries"] == 0
+
+
+def test_template_updates_only_data_between_renders(plantillas_nuevas):
+    primero = errores_posturales_graph({"escala": ["Do Mayor"] * 3, "totalErroresPosturales": [3, 8, 1],
+                                        "dia": ["2025-11-03", "2025-11-01", "2025-11-02"]})
+    segundo = errores_posturales_graph({"escala": ["Do Mayor"] * 3, "totalErroresPosturales": [9, 2, 4],
+                                        "dia": ["2025-12-01", "2025-12-02", "2025-12-03"]})
+    validar_png(segundo)
+    assert segundo != primero
+
+    plantilla = progress_charts._plantillas[("errores_posturales", 3, (7, 4), None)]
+    assert [bar.get_height() for bar in plantilla.series[0]] == [9, 2, 4]
+    assert [texto.get_text() for texto in plantilla.anotaciones] == ["9", "2", "4"]
+    assert plantilla.renders == 2
+
+
+@pytest.mark.parametrize("grafico, angosto, ancho", [
+    (notas_graph,
+     {"escala": ["Do", "Re"], "notasCorrectas": [4, 6], "notasIncorrectas": [1, 2]},
+     {"escala": ["Sol# Menor armonica", "La Mayor"], "notasCorrectas": [4, 6], "notasIncorrectas": [1, 2]}),
+    (errores_posturales_graph,
+     {"escala": ["Do Mayor"] * 2, "totalErroresPosturales": [1, 2], "dia": ["2025-11-01", "2025-11-02"]},
+     {"escala": ["Do Mayor"] * 2, "totalErroresPosturales": [12345, 67890], "dia": ["2025-11-01", "2025-11-02"]}),
+])
+def test_template_recomputes_layout_when_labels_grow(plantillas_nuevas, grafico, angosto, ancho):
+    grafico(angosto)
+    reutilizado = grafico(ancho)
+    assert json.loads(progress_charts.plantillas_stats())["reused"] == 1
+
+    progress_charts.configure_plantillas(False)
+    assert reutilizado == grafico(ancho)
+
+
+def test_notas_layout_fits_the_last_x_tick_label(plantillas_nuevas):
+    # Cambio intencional respecto al grafico de pyplot: alli tight_layout corria antes de fijar
+    # el limite x y el ultimo tick ("100" con un total de 91) quedaba recortado en "10"
+    notas_graph({"escala": ["Do Mayor", "Re Menor"], "notasCorrectas": [80, 50], "notasIncorrectas": [11, 5]})
+
+    plantilla = progress_charts._plantillas[("notas", 2, (5.5, 4), None)]
+    renderer = plantilla.fig.canvas.get_renderer()
+    limite = plantilla.ax.get_xlim()[1]
+    ultima = [t for t in plantilla.ax.get_xticklabels() if t.get_position()[0] <= limite][-1]
+    assert ultima.get_text() == "100"
+    assert ultima.get_window_extent(renderer).x1 <= plantilla.fig.bbox.width
+
+
+def test_template_keeps_layout_for_labels_of_same_length(plantillas_nuevas):
+    notas_graph(NOTAS)
+    notas_graph(dict(NOTAS, notasCorrectas=[70, 85]))
+
+    plantilla = progress_charts._plantillas[("notas", 2, (5.5, 4), None)]
+    assert (plantilla.renders, plantilla.layouts) == (2, 1)
+
+
+def test_template_registry_is_bounded_by_renderer_bytes(plantillas_nuevas):
+    # A 1650x1200 cada plantilla retiene ~7.9 MB del renderer Agg: con 10 MB cabe una sola
+    progress_charts.configure_plantillas(True, max_bytes=10 * 1024 * 1024)
+    imagen = {"ancho": 1650, "alto": 1200}
+    validar_png(notas_graph(NOTAS, imagen=imagen))
+    validar_png(posturas_graph({"escala": ["Do Mayor"], "tiempoMalaPosturaSegundos": [60],
+                                "tiempoBuenaPosturaSegundos": [120]}, imagen=imagen))
+
+    estado = json.loads(progress_charts.plantillas_stats())
+    assert (estado["entries"], estado["evicted"]) == (1, 1)
+    assert estado["bytes"] == 1650 * 1200 * 4
+
+
+# ==========================================================
+# 🔹 12. Tamano en pixeles, densidad y codificacion
+# ==========================================================
+def tamano_imagen(datos):
+    return Image.open(io.BytesIO(datos)).size
+
+
+def test_chart_renders_at_exact_pixel_size(sin_cache):
+    assert tamano_imagen(notas_graph(NOTAS, imagen={"ancho": 1080, "alto": 617, "densidad": 2.75})) == (1080, 617)
+    assert tamano_imagen(notas_graph(NOTAS, imagen=json.dumps({"ancho": 330}))) == (330, 240)
+    # Solo alto: el ancho se redondea igual que el alto cuando solo se pide ancho (250 * 5.5 / 4 = 343.75)
+    assert tamano_imagen(notas_graph(NOTAS, imagen={"alto": 250})) == (344, 250)
+    assert tamano_imagen(notas_graph(NOTAS, imagen={"densidad": 1.5})) == (825, 600)
+    assert tamano_imagen(notas_graph({"escala": [], "notasCorrectas": [], "notasIncorrectas": []},
+                                     imagen={"ancho": 300, "alto": 200})) == (300, 200)
+
+
+def test_png_compression_and_lossy_formats(sin_cache):
+    rapido = notas_graph(NOTAS, imagen={"compresion": 0})
+    chico = notas_graph(NOTAS, imagen={"compresion": 9})
+    validar_png(rapido)
+    assert len(rapido) > len(chico)
+
+    webp = notas_graph(NOTAS, imagen={"formato": "webp", "calidad": 70})
+    assert webp[:4] == b"RIFF" and webp[8:12] == b"WEBP"
+    jpeg = notas_graph(NOTAS, imagen={"formato": "jpg", "calidad": 60, "ancho": 400, "alto": 300})
+    assert jpeg[:2] == b"\xff\xd8" and tamano_imagen(jpeg) == (400, 300)
+
+
+def test_invalid_image_options_are_rejected():
+    assert notas_graph(NOTAS, imagen={"formato": "gif"}) is None
+    assert notas_graph(NOTAS, imagen={"ancho": 0}) is None
+    with pytest.raises(ValueError):
+        progress_charts._leer_opciones_imagen({"dpi": 300})
+
+
+def test_render_dashboard_accepts_per_chart_image_options(sin_cache, tmp_path):
+    datos = progress_charts_benchmark.datos_dashboard(dias=4)
+    imagen = {"notas": {"ancho": 500, "alto": 360, "formato": "webp"}, "posturas": {"ancho": 640, "alto": 360}}
+    rutas = render_dashboard(datos, workers=1, directorio=str(tmp_path), imagen=imagen)
+
+    assert rutas["notas"].endswith("notas.webp") and rutas["posturas"].endswith("posturas.png")
+    assert Image.open(rutas["notas"]).size == (500, 360)
+    assert Image.open(rutas["posturas"]).size == (640, 360)
+    assert Image.open(rutas["top_escalas"]).size == (450, 350)
+
+
+# ==========================================================
+# 🔹 13. Spec de datos sin rasterizar
+# ==========================================================
+def test_spec_mode_never_imports_matplotlib():
+    codigo = (
+        "import json, sys\n"
+        "import progress_charts, progress_charts_benchmark\n"
+        "datos = progress_charts_benchmark.datos_dashboard(dias=5)\n"
+        "for nombre, valor in datos.items():\n"
+        "    assert json.loads(progress_charts.GRAFICOS[nombre](valor, salida='spec'))['tipo'] == nombre\n"
+        "assert json.loads(progress_charts.notas_graph([], salida='spec'))['tipo'] == 'sin_datos'\n"
+        "assert not [m for m in sys.modules if m.startswith(('matplotlib', 'pandas'))]\n"
+    )
+    resultado = subprocess.run([sys.executable, "-c", codigo], cwd=os.path.dirname(progress_charts.__file__),
+                               capture_output=True, text=True)
+    assert resultado.returncode == 0, resultado.stderr
+
+
+def test_top_escalas_spec_describes_podium():
+    spec = json.loads(top_escalas_graph({"escala": ["Do Mayor", "Re Menor", "Mi Mayor", "Fa Mayor"],
+                                         "vecesPracticada": [5, 20, 9, 1]}, salida="spec"))
+
+    assert spec["orientacion"] == "vertical"
+    assert [texto for _, texto in spec["ejes"]["x"]["ticks"]] == ["Mi Mayor", "Re Menor", "Do Mayor"]
+    assert spec["series"][0]["valores"] == [9, 20, 5]
+    assert spec["series"][0]["colores"] == ["#a7b9e6", "#7b001c", "#b9824d"]
+    assert [anotacion["texto"] for anotacion in spec["anotaciones"]] == ["2", "1", "3"]
+    assert spec["ejes"]["y"]["rango"] == [0.0, 21.0]
+
+
+def test_stacked_spec_starts_second_series_where_first_ends():
+    spec = json.loads(posturas_graph({"escala": ["Do Mayor", "Re Menor"], "tiempoMalaPosturaSegundos": [60, 120],
+                                      "tiempoBuenaPosturaSegundos": [300, 600]}, salida="spec"))
+    buena, mala = spec["series"]
+
+    assert [texto for _, texto in spec["ejes"]["y"]["ticks"]] == ["Re Menor", "Do Mayor"]
+    assert buena["valores"] == [10.0, 5.0] and mala["inicios"] == buena["valores"]
+    assert mala["valores"] == [2.0, 1.0]
+    assert spec["ejes"]["x"]["rango"] == [0.0, pytest.approx(12.6)]
+
+
+def test_spec_matches_raster_artists(plantillas_nuevas):
+    # El bitmap se dibuja aplicando el mismo spec: barras, rangos y etiquetas deben coincidir
+    datos = progress_charts_benchmark.datos_dashboard(dias=6)
+    clases = {plantilla.tipo: plantilla for plantilla in (
+        progress_charts.PlantillaTopEscalas, progress_charts.PlantillaErroresPosturales,
+        progress_charts.PlantillaErroresMusicales, progress_charts.PlantillaPosturas, progress_charts.PlantillaNotas)}
+
+    for nombre, valor in datos.items():
+        spec = json.loads(progress_charts.GRAFICOS[nombre](valor, salida="spec"))
+        validar_png(progress_charts.GRAFICOS[nombre](valor))
+        plantilla = next(p for clave, p in progress_charts._plantillas.items() if clave[0] == nombre)
+        assert isinstance(plantilla, clases[nombre])
+        ax = plantilla.ax
+
+        assert list(ax.get_xlim()) == pytest.approx(spec["ejes"]["x"]["rango"])
+        assert list(ax.get_ylim()) == pytest.approx(spec["ejes"]["y"]["rango"])
+        for barras, serie in zip(plantilla.series, spec["series"]):
+            if spec["orientacion"] == "vertical":
+                alturas = [barra.get_height() for barra in barras]
+                centros = [barra.get_x() + barra.get_width() / 2 for barra in barras]
+            else:
+                alturas = [barra.get_width() for barra in barras]
+                centros = [barra.get_y() + barra.get_height() / 2 for barra in barras]
+            assert alturas == pytest.approx(serie["valores"])
+            assert centros == pytest.approx(serie["posiciones"])
+        for eje, etiquetas in (("x", ax.get_xticklabels()), ("y", ax.get_yticklabels())):
+            if spec["ejes"][eje]["ticks"] is not None:
+                assert [etiqueta.get_text() for etiqueta in etiquetas] == [t for _, t in spec["ejes"][eje]["ticks"]]
+        assert [texto.get_text() for texto in plantilla.anotaciones] == [a["texto"] for a in spec["anotaciones"]]
+
+
+# ==========================================================
+# 🔹 14. Errores agrupados por dia, semana o mes
+# ==========================================================
+def errores_diarios(dias):
+    rng = np.random.RandomState(3)
+    fechas = (np.datetime64("2025-01-06") + np.arange(dias)).astype(str).tolist()
+    return {"escala": ["Do Mayor"] * dias, "totalErroresPosturales": rng.randint(0, 9, dias).tolist(), "dia": fechas}
+
+
+def test_long_history_is_bucketed_under_max_bars():
+    datos = errores_diarios(200)
+    spec = json.loads(errores_posturales_graph(datos, salida="spec"))
+
+    assert spec["intervalo"] == "mes"
+    assert len(spec["series"][0]["valores"]) <= 14 and len(spec["ejes"]["x"]["ticks"]) <= 14
+    assert sum(spec["series"][0]["valores"]) == sum(datos["totalErroresPosturales"])
+    assert spec["inicios"][0] == "2025-01-01" and spec["ejes"]["x"]["ticks"][0][1] == "Jan 2025"
+
+
+def test_same_day_rows_are_summed_and_interval_can_be_forced(plantillas_nuevas):
+    datos = {"escala": ["Do Mayor", "Re Menor", "Do Mayor"], "totalErroresMusicales": [2, 3, 4],
+             "dia": ["2025-11-03", "2025-11-03", "2025-11-12"]}
+    diario = json.loads(errores_musicales_graph(datos, salida="spec"))
+    semanal = json.loads(errores_musicales_graph(datos, salida="spec", intervalo="semana"))
+
+    assert diario["series"][0]["valores"] == [5, 4]
+    assert semanal["intervalo"] == "semana" and semanal["inicios"] == ["2025-11-03", "2025-11-10"]
+    validar_png(errores_musicales_graph(datos, intervalo="semana"))
+    assert errores_musicales_graph(datos, intervalo="quincena") is None
+
+
+def test_bar_count_stays_bounded_as_history_grows(plantillas_nuevas):
+    for dias in (120, 400, 1200):
+        validar_png(errores_posturales_graph(errores_diarios(dias), max_barras=8))
+    plantillas = [clave for clave in progress_charts._plantillas if clave[0] == "errores_posturales"]
+    assert plantillas and all(clave[1] <= 8 for clave in plantillas)
@@ -0,0 +1,68 @@
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+import calibracion_benchmark
+from calibracion import is_calibrated
+from rectificacion import RECTIFIED_HEIGHT, RECTIFIED_WIDTH, KeyboardRectifier
+
+
+def piano_sintetico(**params):
+    return calibracion_benchmark.render_synthetic_piano(
+        center=(640, 190), rotation=4.0, perspective=0.06, aspect=0.22, seed=3, **params
+    )
+
+
+def similitud(imagen, referencia):
+    return float(cv2.matchTemplate(imagen.astype(np.float32), referencia.astype(np.float32), cv2.TM_CCOEFF_NORMED).max())
+
+
+# ==========================================================
+# 🔹 1. Imagen cenital desde las esquinas calibradas
+# ==========================================================
+def test_rectified_frame_matches_keyboard_texture():
+    muestra = piano_sintetico()
+    respuesta = is_calibrated(muestra["jpeg"], muestra["piano_area_percentage"], muestra["height_to_width_ratio"], None)
+    rectificador = KeyboardRectifier()
+    assert rectificador.update(respuesta, frame_width=calibracion_benchmark.FRAME_WIDTH)
+
+    cenital = rectificador.rectify(muestra["frame"])
+    assert cenital.shape == (RECTIFIED_HEIGHT, RECTIFIED_WIDTH)
+    assert similitud(cenital, calibracion_benchmark._keyboard_texture()) > 0.8
+
+
+def test_rectify_yuv_matches_rectify():
+    muestra = piano_sintetico()
+    frame = muestra["frame"]
+    row_stride = 1344
+    buffer = np.zeros(row_stride * frame.shape[0] * 3 // 2, np.uint8)
+    buffer[:row_stride * frame.shape[0]].reshape(frame.shape[0], row_stride)[:, :frame.shape[1]] = frame
+
+    rectificador = KeyboardRectifier()
+    rectificador.update(muestra["corners"], frame_width=frame.shape[1])
+    salida = np.empty((RECTIFIED_HEIGHT, RECTIFIED_WIDTH), np.uint8)
+    desde_yuv = rectificador.rectify_yuv(buffer.tobytes(), frame.shape[1], frame.shape[0], row_stride, out=salida)
+
+    assert desde_yuv is salida
+    assert np.array_equal(desde_yuv, rectificador.rectify(frame))
+
+
+# ==========================================================
+# 🔹 2. Cache de mapas e invalidacion por deriva
+# ==========================================================
+def test_maps_are_reused_until_corners_drift_past_tolerance():
+    esquinas = np.array([[100, 40], [500, 40], [500, 120], [100, 120]], np.float32)
+    rectificador = KeyboardRectifier(tolerance=3.0)
+
+    assert rectificador.update(esquinas.tolist())
+    assert not rectificador.update((esquinas + 2).tolist())
+    assert rectificador.update((esquinas + [5, 0]).tolist())
+    assert json.loads(rectificador.stats())["rebuilds"] == 2
+    assert rectificador.reuses == 1
+
+    assert not rectificador.update({"command": "notCalibrated", "corners": None})
+    assert not rectificador.ready
+    with pytest.raises(ValueError):
+        rectificador.rectify(np.zeros((720, 1280), np.uint8))
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from series_tiempo import agrupar_por_tiempo, elegir_intervalo, etiqueta, inicio, ordinal
+
+
+# ==========================================================
+# 🔹 1. Ordinales de cada intervalo
+# ==========================================================
+def test_weeks_start_on_monday_and_months_on_the_first():
+    dias = np.array(["2025-11-02", "2025-11-03", "2025-11-09", "2025-11-10"], dtype="datetime64[D]")
+    semanas = ordinal(dias, "semana")
+
+    assert semanas[0] != semanas[1] and semanas[1] == semanas[2] != semanas[3]
+    assert str(inicio(semanas[1], "semana")) == "2025-11-03"
+    assert str(inicio(ordinal(dias[:1], "mes"), "mes")[0]) == "2025-11-01"
+    assert str(inicio(ordinal(dias[:1], "trimestre"), "trimestre")[0]) == "2025-10-01"
+    assert etiqueta(ordinal(dias[:1], "trimestre")[0], "trimestre") == "T4 2025"
+    assert etiqueta(ordinal(dias[:1], "anio")[0], "anio") == "2025"
+
+    with pytest.raises(ValueError):
+        ordinal(dias, "quincena")
+
+
+# ==========================================================
+# 🔹 2. Agrupacion vectorizada
+# ==========================================================
+def test_rows_are_summed_per_bucket_in_chronological_order():
+    dias = ["2025-11-05", "2025-11-01", "2025-11-05", "2025-11-03"]
+    ordinales, totales, intervalo = agrupar_por_tiempo(dias, np.array([2, 1, 4, 7]))
+
+    assert intervalo == "dia"
+    assert [str(d) for d in inicio(ordinales, intervalo)] == ["2025-11-01", "2025-11-03", "2025-11-05"]
+    assert totales.tolist() == [1, 7, 6] and totales.dtype == np.int64
+
+
+def test_interval_grows_with_history_to_stay_under_max_bars():
+    inicio_historial = np.datetime64("2025-01-01")
+    for largo, esperado in ((10, "dia"), (60, "semana"), (300, "mes"), (900, "trimestre"), (3000, "anio")):
+        dias = inicio_historial + np.arange(largo)
+        assert elegir_intervalo(dias) == esperado
+
+    dias = inicio_historial + np.arange(400)
+    ordinales, totales, intervalo = agrupar_por_tiempo(dias, np.ones(400, np.int64), max_barras=6)
+    assert intervalo == "trimestre" and len(ordinales) <= 6
+    assert totales.sum() == 400